@@ -1,52 +1,59 @@
 """
 Routes pour les analytics et statistiques
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import Optional
-from app.models import PFEListing, Application
-from app.models.pfe_listing import PFEStatus
-from app.db.database import get_db
+from app.models import PFEListing
+from app.db.replicas import get_read_db
+from app.core.dependencies import Principal, get_current_enterprise
+from app.dashboard.stats import average_match_rate, get_enterprise_statistics
+from app.services.daily_stats import get_time_series
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+
 @router.get("/dashboard-statistics")
 def get_dashboard_statistics(
-    enterprise_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
 ):
     """
     Statistics for Angular dashboard
     """
-    # Filter by enterprise if provided
-    pfe_query = db.query(PFEListing)
-    if enterprise_id:
-        pfe_query = pfe_query.filter(PFEListing.enterprise_id == enterprise_id)
-
-    # Active PFEs
-    active_pfes = pfe_query.filter(PFEListing.status == PFEStatus.OPEN).count()
-
-    # Total applications
-    pfe_ids = [pfe.id for pfe in pfe_query.all()]
-    total_applicants = db.query(Application).filter(
-        Application.pfe_listing_id.in_(pfe_ids)
-    ).count() if pfe_ids else 0
+    stats = get_enterprise_statistics(db, current_user.enterprise_id)
+    return {
+        "active_pfes": stats["activePFEs"],
+        "total_applicants": stats["totalApplicants"],
+        "top_applicants": stats["topApplicants"],
+        "avg_match_rate": round(average_match_rate(db, current_user.enterprise_id), 2)
+    }
 
-    # Top applications (match_rate >= 80)
-    top_applicants = db.query(Application).filter(
-        Application.pfe_listing_id.in_(pfe_ids),
-        Application.match_rate >= 80
-    ).count() if pfe_ids else 0
 
-    # Average match rate
-    avg_match_rate = db.query(func.avg(Application.match_rate)).filter(
-        Application.pfe_listing_id.in_(pfe_ids)
-    ).scalar() if pfe_ids else 0.0
+@router.get("/timeseries")
+def get_timeseries(
+    days: int = Query(30, ge=1, le=365),
+    pfe_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
+):
+    """
+    Daily applications received, status transitions and average match rate
+    for the last `days` days, for the whole enterprise or one of its PFEs.
+    """
+    if pfe_id is not None:
+        owned = db.query(PFEListing.id).filter(
+            PFEListing.id == pfe_id,
+            PFEListing.enterprise_id == current_user.enterprise_id
+        ).first()
+        if not owned:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="PFE listing not found"
+            )
 
     return {
-        "active_pfes": active_pfes,
-        "total_applicants": total_applicants,
-        "top_applicants": top_applicants,
-        "avg_match_rate": round(avg_match_rate or 0.0, 2)
-    }
\ No newline at end of file
+        "days": days,
+        "pfe_id": pfe_id,
+        "series": get_time_series(db, current_user.enterprise_id, days, pfe_id)
+    }
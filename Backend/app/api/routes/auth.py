@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas import (
     StudentRegisterDTO,
     EnterpriseRegisterDTO,
     LoginDTO,
     Token,
+    RefreshTokenDTO,
     MessageResponse
 )
 from app.services.auth_service import (
@@ -12,27 +13,19 @@ from app.services.auth_service import (
     register_enterprise,
     authenticate_user
 )
+from app.services.refresh_tokens import (
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token
+)
 from app.core.security import create_access_token
-from app.db.database import get_db
+from app.db.database import get_async_db
+from app.models import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
-@router.post("/register/student", response_model=Token)
-def register_student_endpoint(
-    dto: StudentRegisterDTO,
-    db: Session = Depends(get_db)
-):
-    """
-    Register a new student user.
-    
-    - **email**: Valid email address
-    - **password**: Min 8 chars, 1 uppercase, 1 lowercase, 1 number
-    - **first_name**: Student's first name
-    - **last_name**: Student's last name
-    """
-    user = register_student(dto, db)
-    
+def _token_response(user: User, refresh_token: str) -> Token:
     token = create_access_token({
         "sub": str(user.id),
         "email": user.email,
@@ -41,16 +34,37 @@ def register_student_endpoint(
     
     return Token(
         access_token=token,
+        refresh_token=refresh_token,
         token_type="bearer",
         user_type=user.role.value,
         profile_completed=user.profile_completed
     )
 
 
+@router.post("/register/student", response_model=Token)
+async def register_student_endpoint(
+    dto: StudentRegisterDTO,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Register a new student user.
+    
+    - **email**: Valid email address
+    - **password**: Min 8 chars, 1 uppercase, 1 lowercase, 1 number
+    - **first_name**: Student's first name
+    - **last_name**: Student's last name
+    """
+    user = await register_student(dto, db)
+    refresh_token = await issue_refresh_token(db, user.id)
+    await db.commit()
+    
+    return _token_response(user, refresh_token)
+
+
 @router.post("/register/enterprise", response_model=Token)
-def register_enterprise_endpoint(
+async def register_enterprise_endpoint(
     dto: EnterpriseRegisterDTO,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new enterprise user.
@@ -60,32 +74,24 @@ def register_enterprise_endpoint(
     - **company_name**: Company name
     - **industry**: Industry sector
     """
-    user = register_enterprise(dto, db)
-    
-    token = create_access_token({
-        "sub": str(user.id),
-        "email": user.email,
-        "role": user.role.value
-    })
+    user = await register_enterprise(dto, db)
+    refresh_token = await issue_refresh_token(db, user.id)
+    await db.commit()
     
-    return Token(
-        access_token=token,
-        token_type="bearer",
-        user_type=user.role.value,
-        profile_completed=user.profile_completed
-    )
+    return _token_response(user, refresh_token)
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     dto: LoginDTO,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Authenticate user and return JWT token.
     Works for both students and enterprises.
+    Password checks run on the dedicated hashing pool (app.core.hashing).
     """
-    user = authenticate_user(dto.email, dto.password, db)
+    user = await authenticate_user(dto.email, dto.password, db)
 
     if not user:
         raise HTTPException(
@@ -100,15 +106,31 @@ def login(
             detail="Account is inactive"
         )
 
-    token = create_access_token({
-        "sub": str(user.id),
-        "email": user.email,
-        "role": user.role.value
-    })
+    refresh_token = await issue_refresh_token(db, user.id)
+    await db.commit()
     
-    return Token(
-        access_token=token,
-        token_type="bearer",
-        user_type=user.role.value,
-        profile_completed=user.profile_completed
-    )
+    return _token_response(user, refresh_token)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    dto: RefreshTokenDTO,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    The presented refresh token is single-use; reusing it revokes every
+    token issued from the same login.
+    """
+    user, refresh_token = await rotate_refresh_token(db, dto.refresh_token)
+    return _token_response(user, refresh_token)
+
+
+@router.post("/logout", response_model=MessageResponse)
+async def logout(
+    dto: RefreshTokenDTO,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Revoke a refresh token and every token issued from the same login"""
+    await revoke_refresh_token(db, dto.refresh_token)
+    return MessageResponse(message="Logged out successfully")
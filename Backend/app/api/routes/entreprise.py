@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 import uuid
-from app.db.database import get_db
-from app.core.dependencies import get_current_user
+from app.db.database import get_db, get_async_db
+from app.db.replicas import get_read_db
+from app.core.dependencies import Principal, get_current_user, invalidate_principal
 from app.models import Enterprise, User, UserRole
 from app.schemas import (
     EnterpriseProfileUpdate,
@@ -24,8 +27,8 @@ os.makedirs(LOGO_DIR, exist_ok=True)
 
 @router.get("/me", response_model=EnterpriseProfileResponse)
 def get_my_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get current enterprise's profile mapped to frontend interface"""
     if current_user.role != UserRole.ENTERPRISE:
@@ -65,7 +68,7 @@ def get_my_profile(
 def complete_enterprise_profile(
     data: EnterpriseProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Complete or update enterprise profile from frontend form"""
     if current_user.role != UserRole.ENTERPRISE:
@@ -106,9 +109,9 @@ def complete_enterprise_profile(
             setattr(enterprise, backend_field, value)
 
     # Mark profile as completed
-    current_user.profile_completed = True
-
-    db.commit()
+    db.execute(
+        update(User).where(User.id == current_user.id).values(profile_completed=True)
+    )
 
     # Send welcome notification if first time completing profile
     if not was_profile_completed:
@@ -119,9 +122,13 @@ def complete_enterprise_profile(
             user_id=current_user.id,
             title="Welcome to PFE Match!",
             message="Your company profile is complete! You can now create PFE listings and find talented students.",
-            notification_type=NotificationType.SYSTEM
+            notification_type=NotificationType.SYSTEM,
+            commit=False
         )
 
+    db.commit()
+    invalidate_principal(current_user.id)
+
     return MessageResponse(message="Profile updated successfully")
 
 
@@ -129,8 +136,8 @@ def complete_enterprise_profile(
 @router.post("/me/logo", response_model=ProfilePictureUploadResponse)
 async def upload_company_logo(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Upload company logo"""
     if current_user.role != UserRole.ENTERPRISE:
@@ -160,10 +167,10 @@ async def upload_company_logo(
         f.write(content)
     
     # Update enterprise profile
-    enterprise = db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
+    enterprise = await db.scalar(select(Enterprise).where(Enterprise.user_id == current_user.id))
     if enterprise:
         enterprise.company_logo = file_path
-        db.commit()
+        await db.commit()
     
     return ProfilePictureUploadResponse(
         message="Company logo uploaded successfully",
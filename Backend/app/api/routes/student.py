@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, UploadFile, File, Form, status, BackgroundTasks
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload, undefer
+from starlette.concurrency import run_in_threadpool
 import os
 import uuid
-from app.db.database import get_db
-from app.core.dependencies import get_current_user
+from typing import Optional
+from app.db.database import get_db, get_async_db
+from app.db.replicas import get_read_db
+from app.core.dependencies import Principal, get_current_user, invalidate_principal
+from app.core.idempotency import run_idempotent
 from app.models import Student, User, UserRole
 from app.models.application import Application
+from app.models.match_details import ApplicationMatchDetails
 from app.models.pfe_listing import PFEListing
 from app.schemas import (
     StudentProfileUpdate,
@@ -16,7 +23,10 @@ from app.schemas import (
     ResumeExtractedData
 )
 from app.services.cv_parser import parse_resume, parse_resume_async
-from app.services.matching_service import calculate_match_score
+from app.services.matching_service import calculate_match_score, match_details_from_result
+from app.services.match_features import refresh_student_features, ensure_pfe_features
+from app.dashboard.stats import invalidate_enterprise_statistics
+from app.services.application_events import application_rescored
 
 router = APIRouter(prefix="/students", tags=["Students"])
 
@@ -30,20 +40,36 @@ os.makedirs(RESUME_DIR, exist_ok=True)
 os.makedirs(PROFILE_PIC_DIR, exist_ok=True)
 
 
-async def recalculate_application_matches(db: Session, student: Student):
+async def recalculate_application_matches(db: AsyncSession, student: Student):
     """
     Recalculate match scores for all applications of a student
     after their CV/profile has been updated.
     """
     # Get all applications for this student
-    applications = db.query(Application).filter(Application.student_id == student.id).all()
+    applications = (
+        await db.scalars(
+            select(Application)
+            .options(selectinload(Application.match_details))
+            .where(Application.student_id == student.id)
+        )
+    ).all()
+
+    # Load all of the related PFE listings in one query
+    pfe_ids = {application.pfe_listing_id for application in applications}
+    pfes = {
+        pfe.id: pfe
+        for pfe in await db.scalars(
+            select(PFEListing).options(undefer(PFEListing.description)).where(PFEListing.id.in_(pfe_ids))
+        )
+    } if pfe_ids else {}
     
     for application in applications:
         try:
             # Get the PFE listing
-            pfe = db.query(PFEListing).filter(PFEListing.id == application.pfe_listing_id).first()
+            pfe = pfes.get(application.pfe_listing_id)
             if not pfe:
                 continue
+            await db.run_sync(ensure_pfe_features, pfe)
             
             # Recalculate match score with updated student skills
             match_result = await calculate_match_score(
@@ -52,36 +78,80 @@ async def recalculate_application_matches(db: Session, student: Student):
                 pfe_required_skills=pfe.skills or [],
                 pfe_title=pfe.title,
                 pfe_description=pfe.description,
-                student_desired_role=student.desired_job_role
+                student_desired_role=student.desired_job_role,
+                student_skill_ids=student.skill_ids,
+                pfe_skill_ids=pfe.skill_ids
             )
             
             # Update application with new match data
+            old_match_rate = application.match_rate
             application.match_rate = match_result.get("score", 0)
-            application.match_explanation = match_result.get("explanation", "")
-            application.matched_skills = match_result.get("matched_skills", [])
-            application.missing_skills = match_result.get("missing_skills", [])
-            application.recommendations = match_result.get("recommendations", "")
+            details = match_details_from_result(match_result)
+            if application.match_details:
+                application.match_details.payload = details
+            else:
+                application.match_details = ApplicationMatchDetails(payload=details)
+            await db.run_sync(application_rescored, application, pfe.enterprise_id, old_match_rate)
             
         except Exception as e:
             print(f"Error recalculating match for application {application.id}: {e}")
             continue
     
-    db.commit()
+    await db.commit()
+
+    for pfe in pfes.values():
+        invalidate_enterprise_statistics(pfe.enterprise_id)
+
+
+# Columns needed to build a StudentProfileResponse
+PROFILE_COLUMNS = (
+    Student.first_name,
+    Student.last_name,
+    Student.profile_picture,
+    Student.desired_job_role,
+    Student.university,
+    Student.short_bio,
+    Student.skills,
+    Student.technologies,
+    Student.linkedin_url,
+    Student.github_url,
+    Student.portfolio_url,
+    Student.resume_url,
+)
+
+
+def _profile_response(student) -> dict:
+    """Profile response from a row of PROFILE_COLUMNS"""
+    return {
+        "firstName": student.first_name,
+        "lastName" : student.last_name,
+        "profileImage": student.profile_picture,
+        "title": student.desired_job_role,
+        "university": student.university,
+        "bio": student.short_bio,
+        "skills": student.skills or [],
+        "technologies": student.technologies or [],
+        "linkedinUrl": student.linkedin_url,
+        "githubUrl": student.github_url,
+        "customLinkUrl": student.portfolio_url,
+        "customLinkLabel": "Portfolio",
+        "resumeName": student.resume_url if student.resume_url else None,
+    }
 
 
 @router.get("/", response_model=list[StudentProfileResponse])
 def get_all_students(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all students"""
-    students = db.query(Student).all()
-    return students
+    students = db.execute(select(*PROFILE_COLUMNS)).all()
+    return [_profile_response(student) for student in students]
 
 
 @router.get("/me", response_model=StudentProfileResponse)
 def get_my_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(
@@ -89,11 +159,9 @@ def get_my_profile(
             detail="Only students can access this endpoint"
         )
 
-    student = (
-        db.query(Student)
-        .filter(Student.user_id == current_user.id)
-        .first()
-    )
+    student = db.execute(
+        select(*PROFILE_COLUMNS).where(Student.user_id == current_user.id)
+    ).first()
 
     if not student:
         raise HTTPException(
@@ -101,21 +169,7 @@ def get_my_profile(
             detail="Student profile not found"
         )
 
-    return {
-        "firstName": student.first_name,
-        "lastName" : student.last_name,
-        "profileImage": student.profile_picture,
-        "title": student.desired_job_role,
-        "university": student.university,
-        "bio": student.short_bio,
-        "skills": student.skills or [],
-        "technologies": student.technologies or [],
-        "linkedinUrl": student.linkedin_url,
-        "githubUrl": student.github_url,
-        "customLinkUrl": student.portfolio_url,
-        "customLinkLabel": "Portfolio",
-        "resumeName": student.resume_url if student.resume_url else None,
-    }
+    return _profile_response(student)
 
 
 
@@ -123,7 +177,7 @@ def get_my_profile(
 def complete_student_profile(
     data: StudentProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Complete or update student profile"""
     if current_user.role != UserRole.STUDENT:
@@ -148,11 +202,18 @@ def complete_student_profile(
         if value is not None:
             setattr(student, field, value)
 
+    # Match features depend on skills, technologies, role and bio
+    if any(
+        update_data.get(field) is not None
+        for field in ("skills", "technologies", "desired_job_role", "short_bio")
+    ):
+        refresh_student_features(db, student)
+
     # Mark profile as completed
-    current_user.profile_completed = True
+    db.execute(
+        update(User).where(User.id == current_user.id).values(profile_completed=True)
+    )
     
-    db.commit()
-
     # Send welcome notification if first time completing profile
     if not was_profile_completed:
         from app.notifications.router import create_notification
@@ -162,8 +223,12 @@ def complete_student_profile(
             user_id=current_user.id,
             title="Welcome to PFE Match!",
             message="Your profile is complete! Start exploring PFE opportunities that match your skills.",
-            notification_type=NotificationType.SYSTEM
+            notification_type=NotificationType.SYSTEM,
+            commit=False
         )
+
+    db.commit()
+    invalidate_principal(current_user.id)
     
     return MessageResponse(message="Profile updated successfully")
 
@@ -175,8 +240,8 @@ async def complete_student_profile_with_files(
     bio: str = Form(...),
     resume: UploadFile = File(None),
     profile_picture: UploadFile = File(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Complete student profile with form data and optional file uploads.
@@ -188,7 +253,7 @@ async def complete_student_profile_with_files(
             detail="Only students can access this endpoint"
         )
 
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -220,7 +285,7 @@ async def complete_student_profile_with_files(
         
         # Try to parse resume for additional data
         try:
-            extracted_data = parse_resume(content)
+            extracted_data = await run_in_threadpool(parse_resume, content)
             student.resume_parsed = True
             
             # Only update if fields are empty
@@ -254,24 +319,41 @@ async def complete_student_profile_with_files(
         
         student.profile_picture = file_path
 
+    await db.run_sync(refresh_student_features, student)
+
     # Mark profile as completed
-    current_user.profile_completed = True
+    await db.execute(
+        update(User).where(User.id == current_user.id).values(profile_completed=True)
+    )
     
-    db.commit()
+    await db.commit()
+    invalidate_principal(current_user.id)
     
     return MessageResponse(message="Profile completed successfully")
 
 
 @router.post("/me/resume", response_model=ResumeUploadResponse)
 async def upload_resume(
+    request: Request,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Upload resume and extract information.
     Extracts GitHub URL, LinkedIn URL, skills, and technologies from the CV.
+    Retries with the same Idempotency-Key header replay the first response.
     """
+    return await run_idempotent(
+        request,
+        idempotency_key,
+        current_user.id,
+        lambda: _upload_resume(file, db, current_user),
+    )
+
+
+async def _upload_resume(file: UploadFile, db: AsyncSession, current_user: Principal):
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -302,11 +384,11 @@ async def upload_resume(
     parsing_status = "pending"
     
     try:
-        extracted_data = parse_resume(content)
+        extracted_data = await run_in_threadpool(parse_resume, content)
         parsing_status = "completed"
         
         # Update student profile with extracted data
-        student = db.query(Student).filter(Student.user_id == current_user.id).first()
+        student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
         if student:
             student.resume_url = file_path
             student.resume_parsed = True
@@ -321,18 +403,20 @@ async def upload_resume(
             if extracted_data.technologies:
                 student.technologies = extracted_data.technologies
             
-            db.commit()
+            await db.run_sync(refresh_student_features, student)
+            await db.commit()
             
             # Recalculate match scores for all existing applications
             await recalculate_application_matches(db, student)
             
     except Exception as e:
         parsing_status = f"failed: {str(e)}"
+        await db.rollback()
         # Still save the resume even if parsing fails
-        student = db.query(Student).filter(Student.user_id == current_user.id).first()
+        student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
         if student:
             student.resume_url = file_path
-            db.commit()
+            await db.commit()
     
     return ResumeUploadResponse(
         message="Resume uploaded successfully",
@@ -344,8 +428,8 @@ async def upload_resume(
 
 @router.delete("/me/resume", response_model=MessageResponse)
 async def delete_resume(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete the current user's resume"""
     if current_user.role != UserRole.STUDENT:
@@ -354,7 +438,7 @@ async def delete_resume(
             detail="Only students can access this endpoint"
         )
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -378,7 +462,7 @@ async def delete_resume(
     # Clear the resume from the database
     student.resume_url = None
     student.resume_parsed = False
-    db.commit()
+    await db.commit()
     
     return MessageResponse(message="Resume deleted successfully")
 
@@ -386,8 +470,8 @@ async def delete_resume(
 @router.post("/me/profile-picture", response_model=ProfilePictureUploadResponse)
 async def upload_profile_picture(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Upload profile picture"""
     if current_user.role != UserRole.STUDENT:
@@ -417,10 +501,10 @@ async def upload_profile_picture(
         f.write(content)
     
     # Update student profile
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
     if student:
         student.profile_picture = file_path
-        db.commit()
+        await db.commit()
     
     return ProfilePictureUploadResponse(
         message="Profile picture uploaded successfully",
@@ -468,8 +552,8 @@ async def parse_cv(
 
 @router.post("/me/parse-resume", response_model=ResumeExtractedData)
 async def parse_my_resume(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Re-parse the current user's uploaded resume using LLM.
@@ -481,7 +565,7 @@ async def parse_my_resume(
             detail="Only students can access this endpoint"
         )
     
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -519,7 +603,8 @@ async def parse_my_resume(
         if extracted_data.technologies:
             student.technologies = extracted_data.technologies
         
-        db.commit()
+        await db.run_sync(refresh_student_features, student)
+        await db.commit()
         
         return extracted_data
     except Exception as e:
@@ -1,32 +1,47 @@
+from collections import defaultdict
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, contains_eager, joinedload, selectinload, undefer
 from app.db.database import SessionLocal
-from app.models import Application, Student, PFEListing, User, UserRole, Enterprise
+from app.models import Application, Enterprise, Student, PFEListing, User
+from app.models.application import ApplicationStatus
 from app.db.database import get_db
-from app.core.dependencies import get_current_user
+from app.db.replicas import get_read_db
+from app.core.dependencies import Principal, get_current_enterprise
+from app.dashboard.stats import invalidate_enterprise_statistics
+from app.services.application_events import application_status_changed, applications_status_changed
 
 router = APIRouter(prefix="/api/applicants", tags=["Applicants"])
 
+MAX_BULK_STATUS_UPDATES = 500
 
-def _format_application(a: Application, db: Session, include_details: bool = False):
-    # Get student info
-    student = a.student
-    if not student:
-        return None
 
-    # Compute initials
-    def initials_from(first_name: str, last_name: str):
-        if not first_name or not last_name:
-            return "?"
-        return (first_name[0] + last_name[0]).upper()
+class ApplicationStatusUpdate(BaseModel):
+    status: ApplicationStatus
+
+
+class StatusUpdate(ApplicationStatusUpdate):
+    id: int
+
+
+class BulkStatusUpdate(BaseModel):
+    updates: List[StatusUpdate] = Field(..., min_length=1, max_length=MAX_BULK_STATUS_UPDATES)
 
-    # Get PFE listing info
-    pfe_title = "Unknown"
-    pfe_id = None
-    if a.pfe_listing:
-        pfe_title = a.pfe_listing.title
-        pfe_id = a.pfe_listing.id
 
+def _initials_from(first_name: str, last_name: str):
+    if not first_name or not last_name:
+        return "?"
+    return (first_name[0] + last_name[0]).upper()
+
+
+def _applicant_summary(a, student, email: str, pfe_title: str, pfe_id):
+    """
+    List fields of an application. `a` needs id, match_rate, created_at and
+    status; `student` needs first_name, last_name, university,
+    desired_job_role, skills and resume_url. Both may be ORM objects or rows.
+    """
     # Get skills from student
     skills = student.skills if student.skills else []
     
@@ -38,11 +53,11 @@ def _format_application(a: Application, db: Session, include_details: bool = Fal
             resume_path = '/' + resume_path
         resume_url = f"http://localhost:8000{resume_path}"
 
-    result = {
+    return {
         "id": a.id,
         "name": f"{student.first_name} {student.last_name}",
-        "initials": initials_from(student.first_name, student.last_name),
-        "email": student.user.email if student.user else "",
+        "initials": _initials_from(student.first_name, student.last_name),
+        "email": email or "",
         "university": student.university or "",
         "fieldOfStudy": student.desired_job_role or "",
         "matchRate": a.match_rate,
@@ -54,6 +69,24 @@ def _format_application(a: Application, db: Session, include_details: bool = Fal
         "skills": skills,
         "resumeUrl": resume_url,
     }
+
+
+def _format_application(a: Application, db: Session, include_details: bool = False):
+    # Get student info
+    student = a.student
+    if not student:
+        return None
+
+    # Get PFE listing info
+    pfe_title = "Unknown"
+    pfe_id = None
+    if a.pfe_listing:
+        pfe_title = a.pfe_listing.title
+        pfe_id = a.pfe_listing.id
+
+    result = _applicant_summary(
+        a, student, student.user.email if student.user else "", pfe_title, pfe_id
+    )
     
     # Add extra details if requested
     if include_details:
@@ -62,6 +95,12 @@ def _format_application(a: Application, db: Session, include_details: bool = Fal
         result["githubUrl"] = student.github_url or ""
         result["portfolioUrl"] = student.portfolio_url or ""
         result["technologies"] = student.technologies if student.technologies else []
+        # LLM match explanation, decompressed from application_match_details
+        details = a.match_details.payload if a.match_details else {}
+        result["matchExplanation"] = details.get("explanation") or ""
+        result["matchedSkills"] = details.get("matched_skills") or []
+        result["missingSkills"] = details.get("missing_skills") or []
+        result["recommendations"] = details.get("recommendations") or ""
         # Build profile picture URL - handle both forward and backslashes
         profile_pic = student.profile_picture
         if profile_pic:
@@ -78,43 +117,166 @@ def _format_application(a: Application, db: Session, include_details: bool = Fal
 
 @router.get("")
 def get_applicants(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
 ):
     """
     Get all applicants for the current enterprise's PFE listings.
     Only enterprise users can access this endpoint.
     """
-    # Check if user is an enterprise
-    if current_user.role != UserRole.ENTERPRISE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only enterprise users can access this endpoint"
+    # Get applications only for this enterprise's PFE listings, selecting just
+    # the listed columns of the application, student and listing in one query
+    rows = db.execute(
+        select(
+            Application.id,
+            Application.match_rate,
+            Application.created_at,
+            Application.status,
+            Application.pfe_listing_id,
+            Student.first_name,
+            Student.last_name,
+            Student.university,
+            Student.desired_job_role,
+            Student.skills,
+            Student.resume_url,
+            User.email,
+            PFEListing.title.label("pfe_title"),
         )
-    
-    # Get enterprise profile
-    enterprise = db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
-    if not enterprise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enterprise profile not found"
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .join(Student, Student.id == Application.student_id)
+        .outerjoin(User, User.id == Student.user_id)
+        .where(PFEListing.enterprise_id == current_user.enterprise_id)
+    ).all()
+    return [
+        _applicant_summary(row, row, row.email, row.pfe_title, row.pfe_listing_id)
+        for row in rows
+    ]
+
+
+@router.patch("/status")
+def bulk_update_status(
+    payload: BulkStatusUpdate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_enterprise)
+):
+    """
+    Change the status of many applications to the current enterprise's
+    listings in one transaction. Applications that do not exist or belong
+    to another enterprise are reported in `notFound`; when an id appears
+    more than once its last status wins. Shortlisted applicants are
+    notified as with PATCH /{id}/status.
+    """
+    from app.notifications.router import create_notifications
+    from app.models import Notification, NotificationType
+
+    requested = {item.id: item.status for item in payload.updates}
+    # Lock the applications so concurrent changes are counted once
+    rows = db.execute(
+        select(
+            Application.id,
+            Application.status,
+            Application.pfe_listing_id,
+            Application.created_at,
+            Student.user_id.label("student_user_id"),
+            PFEListing.title.label("pfe_title"),
         )
-    
-    # Get all PFE listings for this enterprise
-    pfe_ids = [pfe.id for pfe in db.query(PFEListing).filter(PFEListing.enterprise_id == enterprise.id).all()]
-    
-    # Get applications only for this enterprise's PFE listings
-    apps = db.query(Application).filter(Application.pfe_listing_id.in_(pfe_ids)).all()
-    formatted = [_format_application(a, db) for a in apps]
-    return [f for f in formatted if f is not None]
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .join(Student, Student.id == Application.student_id)
+        .where(
+            Application.id.in_(requested),
+            PFEListing.enterprise_id == current_user.enterprise_id,
+        )
+        .with_for_update(of=Application)
+    ).all()
+
+    changes = []
+    unchanged = []
+    ids_by_status = defaultdict(list)
+    for row in rows:
+        new_status = requested[row.id]
+        if ApplicationStatus(row.status) == new_status:
+            unchanged.append(row.id)
+            continue
+        changes.append((row, row.status, new_status))
+        ids_by_status[new_status].append(row.id)
+
+    # One UPDATE per target status
+    for new_status, ids in ids_by_status.items():
+        db.execute(
+            update(Application)
+            .where(Application.id.in_(ids))
+            .values(status=new_status)
+            .execution_options(synchronize_session=False)
+        )
+    applications_status_changed(
+        db, changes, current_user.enterprise_id, changed_by_user_id=current_user.id
+    )
+
+    shortlisted = [
+        row for row, _, new_status in changes
+        if new_status == ApplicationStatus.SHORTLISTED and row.student_user_id
+    ]
+    if shortlisted:
+        enterprise_name = db.scalar(
+            select(Enterprise.company_name).where(Enterprise.id == current_user.enterprise_id)
+        ) or ""
+        create_notifications(db, [
+            Notification(
+                user_id=row.student_user_id,
+                title="You've been shortlisted!",
+                message=f"Great news! {enterprise_name} has shortlisted you for '{row.pfe_title}'.",
+                type=NotificationType.APPLICATION_STATUS,
+                pfe_listing_id=row.pfe_listing_id,
+                application_id=row.id
+            )
+            for row in shortlisted
+        ])
+
+    db.commit()
+    if changes:
+        invalidate_enterprise_statistics(current_user.enterprise_id)
+
+    found = {row.id for row in rows}
+    return {
+        "updated": [
+            {
+                "id": row.id,
+                "status": new_status.value,
+                "previousStatus": ApplicationStatus(old_status).value,
+            }
+            for row, old_status, new_status in changes
+        ],
+        "unchanged": unchanged,
+        "notFound": [id for id in requested if id not in found],
+    }
 
 
 @router.get("/{id}")
-def get_applicant_by_id(id: int, db: Session = Depends(get_db)):
+def get_applicant_by_id(
+    id: int,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
+):
     """
-    Get an application by its ID with full details
+    Get an application to one of the current enterprise's listings with full
+    details, including the match explanation
     """
-    app_obj = db.query(Application).filter(Application.id == id).first()
+    app_obj = (
+        db.query(Application)
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .options(
+            selectinload(Application.match_details),
+            joinedload(Application.student).options(
+                undefer(Student.short_bio), joinedload(Student.user),
+            ),
+            contains_eager(Application.pfe_listing),
+        )
+        .filter(
+            Application.id == id,
+            PFEListing.enterprise_id == current_user.enterprise_id,
+        )
+        .first()
+    )
     if not app_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Application not found"
@@ -130,42 +292,52 @@ def get_applicant_by_id(id: int, db: Session = Depends(get_db)):
 
 
 @router.patch("/{id}/status")
-def update_status(id: int, payload: dict, db: Session = Depends(get_db)):
-    from app.models.application import ApplicationStatus
+def update_status(
+    id: int,
+    payload: ApplicationStatusUpdate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_enterprise)
+):
+    """
+    Change the status of an application to one of the current enterprise's
+    listings. The applicant is notified when shortlisted.
+    """
     from app.notifications.router import create_notification
     from app.models import NotificationType
 
-    app_obj = db.query(Application).filter(Application.id == id).first()
+    # Lock the application so a concurrent change is counted once
+    app_obj = (
+        db.query(Application)
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .filter(
+            Application.id == id,
+            PFEListing.enterprise_id == current_user.enterprise_id,
+        )
+        .with_for_update(of=Application)
+        .first()
+    )
     if not app_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Application not found"
         )
 
-    # Get old status for comparison
-    old_status = app_obj.status.value if hasattr(app_obj.status, "value") else app_obj.status
-
-    # Update status
-    new_status = payload.get("status")
-    if new_status:
-        try:
-            app_obj.status = ApplicationStatus(new_status)
-        except ValueError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid status: {new_status}",
-            )
+    old_status = ApplicationStatus(app_obj.status)
+    enterprise_id = current_user.enterprise_id
 
-    db.commit()
-    db.refresh(app_obj)
+    app_obj.status = payload.status
+    application_status_changed(
+        db, app_obj, enterprise_id, old_status, payload.status,
+        changed_by_user_id=current_user.id,
+    )
 
-    # Send notification to applicant if shortlisted
-    if new_status == "shortlisted" and old_status != "shortlisted":
+    # Send notification to applicant if shortlisted, in the same transaction
+    if payload.status == ApplicationStatus.SHORTLISTED and old_status != ApplicationStatus.SHORTLISTED:
         student = app_obj.student
         if student and student.user_id:
             # Get PFE listing and enterprise info
-            pfe_title = app_obj.pfe_listing.title if app_obj.pfe_listing else "a PFE"
+            pfe_title = app_obj.pfe_listing.title
             enterprise_name = ""
-            if app_obj.pfe_listing and app_obj.pfe_listing.enterprise:
+            if app_obj.pfe_listing.enterprise:
                 enterprise_name = app_obj.pfe_listing.enterprise.company_name or ""
             
             create_notification(
@@ -175,9 +347,14 @@ def update_status(id: int, payload: dict, db: Session = Depends(get_db)):
                 message=f"Great news! {enterprise_name} has shortlisted you for '{pfe_title}'.",
                 notification_type=NotificationType.APPLICATION_STATUS,
                 pfe_listing_id=app_obj.pfe_listing_id,
-                application_id=app_obj.id
+                application_id=app_obj.id,
+                commit=False
             )
 
+    db.commit()
+    db.refresh(app_obj)
+    invalidate_enterprise_statistics(enterprise_id)
+
     result = _format_application(app_obj, db)
     if not result:
         raise HTTPException(
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,12 +7,77 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     DATABASE_URL: str
+    # Defaults to DATABASE_URL with the matching async driver (asyncpg / aiosqlite)
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Connection pool (per engine, per worker process)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Server-side statement timeout on PostgreSQL, 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    # Bearer token required by GET /metrics; unset, the endpoint is disabled
+    METRICS_TOKEN: Optional[str] = None
+    # Comma-separated read replica URLs, empty to read from the primary
+    DATABASE_REPLICA_URLS: str = ""
+    # How often a background task probes every replica
+    REPLICA_HEALTH_CHECK_SECONDS: int = 30
+    # Reads stay on the primary this long after a user's write
+    READ_YOUR_WRITES_SECONDS: int = 5
+    # Per-enterprise dashboard statistics cache, 0 disables it
+    DASHBOARD_CACHE_TTL_SECONDS: int = 30
+    # Authenticated principal (user, role, linked profile id) cache, 0 disables it
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    # bcrypt cost; existing hashes are upgraded on the next login
+    BCRYPT_ROUNDS: int = 12
+    # Dedicated password hashing executor and its queue bound
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    # Per-user unread notification count cache, 0 disables it
+    UNREAD_COUNT_CACHE_TTL_SECONDS: int = 15
+    # How often unread counters are reconciled with the notifications table, 0 disables it
+    NOTIFICATION_COUNTER_RECONCILE_SECONDS: int = 3600
+    # Users whose counters are reconciled per transaction
+    NOTIFICATION_COUNTER_RECONCILE_BATCH_SIZE: int = 1000
+    # Notification stream (server-sent events)
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: int = 15
+    NOTIFICATION_STREAM_RETRY_MS: int = 5000
+    # Lifetime of the single-purpose tickets that open a stream
+    NOTIFICATION_STREAM_TICKET_SECONDS: int = 60
+    # Notification outbox: fallback poll interval and rows delivered per batch
+    NOTIFICATION_OUTBOX_POLL_SECONDS: int = 5
+    NOTIFICATION_OUTBOX_BATCH_SIZE: int = 500
+    # "New application" notifications for enterprises: "each" sends one per
+    # application, "coalesce" merges those of a listing into one rolling
+    # notification, "digest" sends a periodic summary instead
+    NEW_APPLICATION_NOTIFICATIONS: Literal["each", "coalesce", "digest"] = "coalesce"
+    NOTIFICATION_COALESCE_WINDOW_SECONDS: int = 3600
+    NOTIFICATION_DIGEST_INTERVAL_SECONDS: int = 86400
+    # Read notifications older than this move to notifications_archive, 0 disables it
+    NOTIFICATION_RETENTION_DAYS: int = 90
+    # Archived notifications are dropped after this, 0 keeps them
+    NOTIFICATION_ARCHIVE_RETENTION_DAYS: int = 730
+    NOTIFICATION_RETENTION_INTERVAL_SECONDS: int = 3600
+    NOTIFICATION_RETENTION_BATCH_SIZE: int = 1000
+    # Stored responses for Idempotency-Key retries
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+    # A claim not renewed for this long is considered abandoned; running
+    # requests renew theirs every third of it
+    IDEMPOTENCY_LOCK_SECONDS: int = 300
+    # How long a concurrent duplicate waits for the original request
+    IDEMPOTENCY_WAIT_SECONDS: int = 60
     CORS_ORIGINS: str = "http://localhost:4200,http://127.0.0.1:4200"
     OPENAI_API_KEY: Optional[str] = None
     
     @property
     def cors_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+
+    @property
+    def replica_urls_list(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
     
     class Config:
         env_file = ".env"
@@ -1,48 +1,180 @@
-from fastapi import Depends, HTTPException, status
+"""
+Authentication dependencies.
+
+`get_current_user` resolves the bearer token to a `Principal`: the user's
+id, role, flags and linked student or enterprise id. Principals are cached
+per worker for PRINCIPAL_CACHE_TTL_SECONDS, so a cache hit costs no query and
+a miss costs one. Code that changes a user's role, active or profile flags
+must call `invalidate_principal`.
+"""
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import register_metrics
 from app.core.security import decode_token
 from app.db.database import get_db
-from app.models import User
+from app.models import Enterprise, Student, User, UserRole
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers"""
+    id: int
+    email: str
+    role: UserRole
+    is_active: bool
+    profile_completed: bool
+    student_id: Optional[int] = None
+    enterprise_id: Optional[int] = None
+
+
+_principals = TTLCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
+register_metrics("principal_cache", _principals.stats)
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Load a user and their linked profile id in one query"""
+    row = db.execute(
+        select(
+            User.id,
+            User.email,
+            User.role,
+            User.is_active,
+            User.profile_completed,
+            Student.id.label("student_id"),
+            Enterprise.id.label("enterprise_id"),
+        )
+        .outerjoin(Student, Student.user_id == User.id)
+        .outerjoin(Enterprise, Enterprise.user_id == User.id)
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    return Principal(
+        id=row.id,
+        email=row.email,
+        role=row.role,
+        is_active=bool(row.is_active),
+        profile_completed=bool(row.profile_completed),
+        student_id=row.student_id,
+        enterprise_id=row.enterprise_id,
+    )
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop a cached principal after the user row or its profile link changes"""
+    _principals.invalidate(user_id)
 
 
 def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
-    payload = decode_token(token)
+) -> Principal:
+    """
+    Get current authenticated user from JWT token.
+    The principal is also kept on request.state for middleware.
+    """
+    request.state.principal = principal_from_token_payload(decode_token(token), db)
+    return request.state.principal
+
+
+def get_optional_user(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    """Current user on endpoints that also serve anonymous requests; None without a valid token"""
+    if not token:
+        return None
+    try:
+        request.state.principal = principal_from_token_payload(decode_token(token), db)
+    except HTTPException:
+        return None
+    return request.state.principal
+
+
+def principal_from_token_payload(payload: dict, db: Session, scope: Optional[str] = None) -> Principal:
+    """
+    Resolve a decoded token to an active principal, raising 401/403 otherwise.
+    Access tokens carry no scope; single-purpose tokens (such as notification
+    stream tickets) are only accepted where their scope is expected.
+    """
     user_id = payload.get("sub")
-    
-    if user_id is None:
+
+    if user_id is None or payload.get("scope") != scope:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    
+
+    user_id = int(user_id)
+    user = _principals.get(user_id)
+    if user is None:
+        user = load_principal(db, user_id)
+        if user is not None:
+            _principals.set(user_id, user)
+
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
-    
+
     return user
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Ensure user is active"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+def get_current_enterprise(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Current user, which must be an enterprise with a profile"""
+    if current_user.role != UserRole.ENTERPRISE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only enterprise users can access this endpoint"
+        )
+    if current_user.enterprise_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Enterprise profile not found"
+        )
+    return current_user
+
+
+def get_current_student(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Current user, which must be a student with a profile"""
+    if current_user.role != UserRole.STUDENT:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only students can access this endpoint"
+        )
+    if current_user.student_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student profile not found"
+        )
+    return current_user
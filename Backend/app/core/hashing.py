@@ -0,0 +1,111 @@
+"""
+Password hashing off the request threadpool.
+
+bcrypt is deliberately slow, so hashing and verification run on a small
+dedicated executor (PASSWORD_HASH_WORKERS threads) instead of the shared
+threadpool that serves sync endpoints. A login burst then queues behind
+other logins only. At most PASSWORD_HASH_MAX_PENDING operations may be
+queued or running; beyond that callers get a 503 with Retry-After.
+
+The bcrypt cost is BCRYPT_ROUNDS. Hashes made with other parameters are
+flagged by passlib and replaced on the next successful login.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+class HashingPool:
+    """Bounded executor for CPU-bound password work, with queueing metrics"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many authentication requests, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, submitted, fn, *args
+            )
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _timed(self, submitted: float, fn: Callable, *args):
+        started = time.perf_counter()
+        wait = started - submitted
+        with self._lock:
+            self.running += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.run_seconds_total += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        done = self.completed
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": self.pending - self.running,
+            "running": self.running,
+            "completed": done,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(self.wait_seconds_total / done * 1000, 3) if done else 0.0,
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            "run_ms_avg": round(self.run_seconds_total / done * 1000, 3) if done else 0.0,
+        }
+
+
+hashing_pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+register_metrics("password_hashing", hashing_pool.stats)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await hashing_pool.run(pwd_context.hash, password)
+
+
+async def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the hashing pool.
+    Returns (valid, new_hash); new_hash is set when the stored hash uses
+    outdated parameters and should be replaced.
+    """
+    return await hashing_pool.run(pwd_context.verify_and_update, password, hashed_password)
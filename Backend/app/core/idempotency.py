@@ -0,0 +1,209 @@
+"""
+Idempotency-Key support for expensive POST endpoints.
+
+The first request with a given key claims it in the idempotency_keys table;
+its response is stored for IDEMPOTENCY_KEY_TTL_SECONDS and replayed to
+retries with the same key. A retry that arrives while the original request
+is still running waits for it instead of recomputing. Requests that raise
+release the key so the client can retry them.
+
+A key reused for a request with a different path, query string or body is
+rejected with 422. The claim is renewed while the original request runs, so
+it only lapses IDEMPOTENCY_LOCK_SECONDS after its worker stopped.
+
+Claims are committed in their own session, independently of the endpoint's
+transaction, so they are visible to every worker immediately.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from starlette.datastructures import UploadFile
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.upsert import upsert_insert
+from app.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting duplicate re-checks the original request
+POLL_INTERVAL_SECONDS = 0.25
+# Claims are renewed this many times per IDEMPOTENCY_LOCK_SECONDS
+HEARTBEATS_PER_LOCK = 3
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _record_filter(user_id: int, key: str):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+
+
+async def _request_fingerprint(request: Request) -> str:
+    """SHA-256 of the method, path, query string and body"""
+    digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}".encode())
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        # FastAPI already parsed the form, which consumed the raw body
+        for name, value in (await request.form()).multi_items():
+            digest.update(b"\0" + name.encode() + b"\0")
+            if isinstance(value, UploadFile):
+                digest.update(await value.read())
+                await value.seek(0)
+            else:
+                digest.update(value.encode())
+    else:
+        digest.update(b"\0" + await request.body())
+    return digest.hexdigest()
+
+
+async def _claim(user_id: int, key: str, endpoint: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """Claim the key. Returns None when claimed, otherwise the existing record."""
+    async with AsyncSessionLocal() as db:
+        now = _utcnow()
+        # Drop an expired response, or a claim abandoned by a crashed worker
+        await db.execute(delete(IdempotencyKey).where(*_record_filter(user_id, key), IdempotencyKey.expires_at < now))
+
+        values = {
+            "user_id": user_id,
+            "key": key,
+            "endpoint": endpoint,
+            "request_hash": request_hash,
+            "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+        }
+        dialect_insert = upsert_insert(db.bind.dialect.name)
+        if dialect_insert is not None:
+            result = await db.execute(
+                dialect_insert(IdempotencyKey)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=["user_id", "key"])
+                .returning(IdempotencyKey.key)
+            )
+            claimed = result.first() is not None
+        else:
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(IdempotencyKey).values(**values))
+                claimed = True
+            except IntegrityError:
+                claimed = False
+
+        record = None
+        if not claimed:
+            record = await db.scalar(select(IdempotencyKey).where(*_record_filter(user_id, key)))
+        await db.commit()
+
+    if claimed:
+        return None
+    # The record disappeared in between (expired or released): report an
+    # in-progress placeholder so the caller tries to claim it again
+    return record or IdempotencyKey(user_id=user_id, key=key, endpoint=endpoint, request_hash=request_hash)
+
+
+async def _heartbeat(user_id: int, key: str) -> None:
+    """Renew the claim until cancelled, once the handler has finished"""
+    interval = settings.IDEMPOTENCY_LOCK_SECONDS / HEARTBEATS_PER_LOCK
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(IdempotencyKey)
+                    .where(*_record_filter(user_id, key), IdempotencyKey.response_status.is_(None))
+                    .values(expires_at=_utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS))
+                )
+                await db.commit()
+        except SQLAlchemyError:
+            # The next beat tries again; the claim lasts several intervals
+            logger.exception("Could not renew Idempotency-Key claim")
+
+
+async def _complete(user_id: int, key: str, status_code: int, body: Any) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(*_record_filter(user_id, key))
+            .values(
+                response_status=status_code,
+                response_body=body,
+                expires_at=_utcnow() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+            )
+        )
+        await db.commit()
+
+
+async def _release(user_id: int, key: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(IdempotencyKey).where(*_record_filter(user_id, key)))
+        await db.commit()
+
+
+async def run_idempotent(
+    request: Request,
+    idempotency_key: Optional[str],
+    user_id: int,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = status.HTTP_200_OK,
+) -> Any:
+    """
+    Run `handler` at most once per (user, Idempotency-Key).
+    Without a key the handler simply runs.
+    """
+    if not idempotency_key:
+        return await handler()
+    if len(idempotency_key) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key must be at most 255 characters"
+        )
+
+    endpoint = f"{request.method} {request.url.path}"
+    request_hash = await _request_fingerprint(request)
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = await _claim(user_id, idempotency_key, endpoint, request_hash)
+        if record is None:
+            break
+        # Claims made before fingerprints were stored only compare endpoints
+        if record.endpoint != endpoint or record.request_hash not in (None, request_hash):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if record.response_status is not None:
+            return JSONResponse(
+                status_code=record.response_status,
+                content=record.response_body,
+                headers={"Idempotent-Replayed": "true"},
+            )
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    heartbeat = asyncio.create_task(_heartbeat(user_id, idempotency_key))
+    try:
+        result = await handler()
+    except BaseException:
+        heartbeat.cancel()
+        await _release(user_id, idempotency_key)
+        raise
+    heartbeat.cancel()
+
+    await _complete(user_id, idempotency_key, status_code, jsonable_encoder(result))
+    return result
+
+
+async def purge_expired_idempotency_keys() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < _utcnow()))
+        await db.commit()
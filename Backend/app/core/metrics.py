@@ -0,0 +1,36 @@
+"""
+In-process metrics registry.
+
+Subsystems register a collector returning a JSON-serializable snapshot;
+GET /metrics returns all of them to requests bearing METRICS_TOKEN.
+"""
+import secrets
+from typing import Callable, Dict, Optional
+from fastapi import Header, HTTPException, status
+from app.core.config import settings
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, collector: Callable[[], dict]) -> None:
+    """Register (or replace) the collector for a metrics section"""
+    _collectors[name] = collector
+
+
+def collect_metrics() -> dict:
+    """Snapshot of every registered metrics section"""
+    return {name: collector() for name, collector in _collectors.items()}
+
+
+def verify_metrics_token(authorization: Optional[str] = Header(None)) -> None:
+    """Dependency admitting requests with `Authorization: Bearer <METRICS_TOKEN>`"""
+    if not settings.METRICS_TOKEN:
+        # Metrics are not exposed unless a token is configured
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,73 @@
+"""
+Enterprise dashboard statistics.
+
+Read from the per-PFE rollup (app.services.stats_rollup) and cached per
+enterprise for DASHBOARD_CACHE_TTL_SECONDS. Code that creates applications,
+changes their status or match rate, or creates listings must call
+`invalidate_enterprise_statistics`.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.models import PFEListing, PFEStatsRollup
+from app.models.pfe_listing import PFEStatus
+
+_cache = TTLCache(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS)
+register_metrics("dashboard_cache", _cache.stats)
+
+
+def _enterprise_totals(db: Session, enterprise_id: int):
+    """
+    Open listings, applications, top applicants and the average match rate
+    of an enterprise in one aggregate query over its rollup rows. The
+    average covers scored applications only (coalesce(avg(match_rate), 0)),
+    like the daily buckets.
+    """
+    active_pfes = (
+        select(func.count(PFEListing.id))
+        .where(PFEListing.enterprise_id == enterprise_id, PFEListing.status == PFEStatus.OPEN)
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(
+            active_pfes.label("active_pfes"),
+            func.coalesce(func.sum(PFEStatsRollup.total_applications), 0).label("total_applicants"),
+            func.coalesce(func.sum(PFEStatsRollup.top_applicants), 0).label("top_applicants"),
+            func.sum(PFEStatsRollup.match_rate_sum).label("match_rate_sum"),
+            func.sum(PFEStatsRollup.match_rate_count).label("match_rate_count"),
+        ).where(PFEStatsRollup.enterprise_id == enterprise_id)
+    ).one()
+    average = row.match_rate_sum / row.match_rate_count if row.match_rate_count else 0.0
+    return row.active_pfes or 0, row.total_applicants, row.top_applicants, average
+
+
+def compute_enterprise_statistics(db: Session, enterprise_id: int) -> dict:
+    """Dashboard statistics for one enterprise from its rollup rows"""
+    active_pfes, total_applicants, top_applicants, average = _enterprise_totals(db, enterprise_id)
+    return {
+        "activePFEs": active_pfes,
+        "totalApplicants": total_applicants,
+        "topApplicants": top_applicants,
+        "avgMatchRate": int(average),
+    }
+
+
+def average_match_rate(db: Session, enterprise_id: int) -> float:
+    """Unrounded average match rate of an enterprise's scored applications"""
+    return _enterprise_totals(db, enterprise_id)[3]
+
+
+def get_enterprise_statistics(db: Session, enterprise_id: int) -> dict:
+    """Cached dashboard statistics for one enterprise"""
+    stats = _cache.get(enterprise_id)
+    if stats is None:
+        stats = compute_enterprise_statistics(db, enterprise_id)
+        _cache.set(enterprise_id, stats)
+    return stats
+
+
+def invalidate_enterprise_statistics(enterprise_id) -> None:
+    if enterprise_id is not None:
+        _cache.invalidate(enterprise_id)
@@ -0,0 +1,37 @@
+"""
+Atomic counter upserts.
+
+`increment` adds deltas to a counter row, creating it when it does not
+exist yet, in the caller's transaction. PostgreSQL and SQLite use
+INSERT ... ON CONFLICT DO UPDATE; other dialects fall back to
+UPDATE-then-INSERT.
+"""
+from typing import Dict
+from sqlalchemy import Table, insert, update
+from sqlalchemy.orm import Session
+from app.db.upsert import upsert_insert
+
+
+def increment(db: Session, table: Table, key: Dict[str, object], deltas: Dict[str, int]) -> None:
+    """Add `deltas` to the columns of the row identified by `key`"""
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    dialect_insert = upsert_insert(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(**key, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + stmt.excluded[column] for column in deltas},
+        )
+        db.execute(stmt)
+        return
+
+    updated = db.execute(
+        update(table)
+        .where(*[table.c[column] == value for column, value in key.items()])
+        .values({column: table.c[column] + delta for column, delta in deltas.items()})
+    ).rowcount
+    if not updated:
+        db.execute(insert(table).values(**key, **deltas))
@@ -0,0 +1,188 @@
+"""
+Idempotent schema upgrades for existing databases.
+
+`Base.metadata.create_all` only creates missing tables; it never alters
+existing ones. Changes to columns or indexes on tables that already exist
+are applied here at startup.
+"""
+import logging
+from sqlalchemy import JSON, Text, bindparam, column, insert, inspect, select, table, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+from app.db.database import Base
+from app.db.types import CompressedJSON
+
+logger = logging.getLogger(__name__)
+
+# Command removing the rows that block a unique index, by index name
+UNIQUE_INDEX_CLEANUP = {
+    "uq_applications_student_id_pfe_listing_id": "python -m app.services.application_dedupe",
+}
+
+# Indexes removed from the models, dropped from existing databases
+DROPPED_INDEXES = [
+    # Primary key index duplicate
+    "ix_notifications_id",
+    # Covered by ix_notifications_user_id_created_at_id and the partial unread index
+    "ix_notifications_user_id_is_read_created_at",
+]
+
+# Statements filling a column right after it is added: (table, column) -> SQL
+COLUMN_BACKFILLS = {
+    # Digests used to be the new-application notifications without a listing
+    ("notifications", "is_digest"): (
+        "UPDATE notifications SET is_digest = true WHERE type = 'NEW_APPLICATION' "
+        "AND pfe_listing_id IS NULL AND title = 'Your Application Digest'"
+    ),
+}
+
+# (table, column) pairs stored as JSONB on PostgreSQL
+JSONB_COLUMNS = [
+    ("students", "skills"),
+    ("students", "technologies"),
+    ("pfe_listings", "skills"),
+    ("entreprise", "technologies_used"),
+]
+
+
+def _add_missing_columns(conn) -> None:
+    """Add nullable or server-defaulted model columns that are missing from existing tables"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for model_table in Base.metadata.sorted_tables:
+        if model_table.name not in existing_tables:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(model_table.name)}
+        for model_column in model_table.columns:
+            if model_column.name in existing_columns or not (model_column.nullable or model_column.server_default is not None):
+                continue
+            column_ddl = CreateColumn(model_column).compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE "{model_table.name}" ADD COLUMN {column_ddl}'))
+            backfill = COLUMN_BACKFILLS.get((model_table.name, model_column.name))
+            if backfill:
+                conn.execute(text(backfill))
+
+
+def _create_missing_indexes(conn) -> None:
+    """
+    Create model indexes that are missing from existing tables. A unique
+    index that existing rows violate stops startup: removing the duplicates
+    is an explicit one-off command (see UNIQUE_INDEX_CLEANUP).
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for model_table in Base.metadata.sorted_tables:
+        if model_table.name not in existing_tables:
+            continue
+        existing_indexes = {i["name"] for i in inspector.get_indexes(model_table.name)}
+        for index in model_table.indexes:
+            if index.name in existing_indexes:
+                continue
+            # Goes through the DDL generator so dialect-specific indexes
+            # (ddl_if) are skipped where they do not apply. A savepoint keeps
+            # a failing non-unique index from aborting the other upgrades.
+            try:
+                with conn.begin_nested():
+                    index.create(conn)
+            except DBAPIError as e:
+                if index.unique:
+                    cleanup = UNIQUE_INDEX_CLEANUP.get(index.name, "remove the duplicate rows")
+                    raise RuntimeError(
+                        f"Cannot create unique index {index.name}: existing {model_table.name} rows "
+                        f"violate it. Run `{cleanup}` and restart."
+                    ) from e
+                logger.exception("Could not create index %s", index.name)
+
+
+def _drop_obsolete_indexes(conn) -> None:
+    for name in DROPPED_INDEXES:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+
+def _upgrade_jsonb_columns(conn) -> None:
+    for table_name, column_name in JSONB_COLUMNS:
+        data_type = conn.execute(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :column"
+            ),
+            {"table": table_name, "column": column_name},
+        ).scalar()
+        if data_type == "json":
+            conn.execute(
+                text(
+                    f'ALTER TABLE "{table_name}" ALTER COLUMN "{column_name}" '
+                    f'TYPE jsonb USING "{column_name}"::jsonb'
+                )
+            )
+        conn.execute(
+            text(
+                f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{column_name}_gin" '
+                f'ON "{table_name}" USING gin ("{column_name}" jsonb_path_ops)'
+            )
+        )
+
+
+# Inline LLM explanation columns moved to compressed payloads:
+# table -> (payload table, payload key column, {legacy column: payload key})
+INLINE_MATCH_DETAILS = {
+    "applications": ("application_match_details", "application_id", {
+        "match_explanation": "explanation",
+        "matched_skills": "matched_skills",
+        "missing_skills": "missing_skills",
+        "recommendations": "recommendations",
+    }),
+    "match_previews": ("match_previews", "id", {
+        "explanation": "explanation",
+        "matched_skills": "matched_skills",
+        "missing_skills": "missing_skills",
+        "recommendations": "recommendations",
+    }),
+}
+
+
+def _move_inline_match_details(conn) -> None:
+    """Copy legacy inline match explanation columns into compressed payloads, then drop them"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table_name, (target_name, key_column, legacy) in INLINE_MATCH_DETAILS.items():
+        if table_name not in existing_tables:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table_name)}
+        legacy_columns = [name for name in legacy if name in existing_columns]
+        if not legacy_columns:
+            continue
+
+        source = table(table_name, column("id"), *[
+            column(name, JSON if "skills" in name else Text) for name in legacy_columns
+        ])
+        rows = [
+            {"key": row.id, "new_payload": {legacy[name]: getattr(row, name) for name in legacy_columns}}
+            for row in conn.execute(select(source))
+        ]
+        if rows:
+            target = table(target_name, column(key_column), column("payload", CompressedJSON))
+            key = bindparam("key")
+            payload = bindparam("new_payload", type_=CompressedJSON)
+            if target_name == table_name:
+                statement = update(target).where(target.c[key_column] == key).values(payload=payload)
+            else:
+                statement = insert(target).values({key_column: key, "payload": payload})
+            conn.execute(statement, rows)
+
+        for name in legacy_columns:
+            conn.execute(text(f'ALTER TABLE "{table_name}" DROP COLUMN "{name}"'))
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply pending upgrades. Safe to run on every startup."""
+    with engine.begin() as conn:
+        _add_missing_columns(conn)
+
+        if engine.dialect.name == "postgresql":
+            _upgrade_jsonb_columns(conn)
+
+        _create_missing_indexes(conn)
+        _drop_obsolete_indexes(conn)
+        _move_inline_match_details(conn)
@@ -0,0 +1,136 @@
+"""
+Connection pool configuration and telemetry.
+
+Engines are built with pool settings from `Settings`. `instrument_pool`
+follows each pool through its public checkout / checkin events: how many
+connections are in use, how often the pool runs into overflow, how long
+connections are held and how long every connection was in use at once
+(any checkout during that time waits for a checkin, or times out).
+"""
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.core.config import settings
+from app.core.metrics import register_metrics
+
+
+class PoolMetrics:
+    """Checkout counters for one engine's pool"""
+
+    def __init__(self, engine: Engine):
+        self._engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.checked_out_max = 0
+        self.hold_seconds_total = 0.0
+        self.hold_seconds_max = 0.0
+        self.saturations = 0
+        self.saturated_seconds_total = 0.0
+        self._saturated_since: Optional[float] = None
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        # The pool is read through the engine: dispose() replaces it
+        pool = self._engine.pool
+        now = time.perf_counter()
+        connection_record.info["checked_out_at"] = now
+        checked_out = pool.checkedout()
+        with self._lock:
+            self.checkouts += 1
+            if pool.overflow() > 0:
+                self.overflow_checkouts += 1
+            self.checked_out_max = max(self.checked_out_max, checked_out)
+            if self._saturated_since is None and checked_out >= pool.size() + settings.DB_MAX_OVERFLOW:
+                self._saturated_since = now
+                self.saturations += 1
+
+    def on_checkin(self, dbapi_connection, connection_record) -> None:
+        now = time.perf_counter()
+        checked_out_at = connection_record.info.pop("checked_out_at", None) if connection_record else None
+        with self._lock:
+            if checked_out_at is not None:
+                held = now - checked_out_at
+                self.hold_seconds_total += held
+                self.hold_seconds_max = max(self.hold_seconds_max, held)
+            if self._saturated_since is not None:
+                self.saturated_seconds_total += now - self._saturated_since
+                self._saturated_since = None
+
+    def snapshot(self) -> dict:
+        pool = self._engine.pool
+        with self._lock:
+            saturated = self.saturated_seconds_total
+            if self._saturated_since is not None:
+                saturated += time.perf_counter() - self._saturated_since
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_out_max": self.checked_out_max,
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "hold_ms_avg": round(self.hold_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "hold_ms_max": round(self.hold_seconds_max * 1000, 3),
+                "saturations": self.saturations,
+                "saturated_ms_total": round(saturated * 1000, 3),
+            }
+
+
+_pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    """
+    Collect checkout metrics for the engine's pool under `name` in
+    GET /metrics. Pass `async_engine.sync_engine` for async engines.
+    Listeners on the engine carry over to the pool dispose() creates.
+    """
+    if not isinstance(engine.pool, QueuePool):
+        # In-memory SQLite has a single connection and nothing to size
+        return
+    metrics = PoolMetrics(engine)
+    event.listen(engine, "checkout", metrics.on_checkout)
+    event.listen(engine, "checkin", metrics.on_checkin)
+    _pool_metrics[name] = metrics
+
+
+def engine_options(name: str, url: str, is_async: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine.
+    `name` labels the pool in SQLAlchemy's pool logging.
+    """
+    parsed = make_url(url)
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+    # In-memory SQLite uses a single shared connection; pool sizing does not apply
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+
+    options.update(
+        poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_logging_name=name,
+    )
+
+    if parsed.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+
+    return options
+
+
+register_metrics(
+    "db_pools",
+    lambda: {name: metrics.snapshot() for name, metrics in _pool_metrics.items()},
+)
@@ -0,0 +1,132 @@
+"""
+Read-replica routing.
+
+`get_read_db` hands out sessions bound to one of the configured read
+replicas (round-robin, skipping replicas that failed their last health
+check) and falls back to the primary when none is available. Replicas are
+probed by a background task every REPLICA_HEALTH_CHECK_SECONDS, never on
+the request path.
+
+Read-your-writes: after a user performs a write, their reads stick to the
+primary for READ_YOUR_WRITES_SECONDS so they do not observe replica lag.
+Writes are tracked per worker process, by the authenticated principal.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from fastapi import Depends
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.dependencies import Principal, get_optional_user
+from app.db.database import SessionLocal
+from app.db.pool import engine_options, instrument_pool
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """A read replica engine with the result of its last health check"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **engine_options(name, url))
+        instrument_pool(self.engine, name)
+        self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.healthy = True
+
+    def probe(self) -> None:
+        """Run one health check and record its result"""
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception:
+            if self.healthy:
+                logger.warning("Read replica %s failed its health check", self.name, exc_info=True)
+            self.healthy = False
+            return
+        if not self.healthy:
+            logger.info("Read replica %s passed its health check again", self.name)
+        self.healthy = True
+
+
+replicas: List[Replica] = [
+    Replica(f"replica_{index}", url)
+    for index, url in enumerate(settings.replica_urls_list)
+]
+_round_robin = itertools.count()
+
+_recent_writes: Dict[int, float] = {}
+_recent_writes_lock = threading.Lock()
+
+
+def mark_write(user_id: int) -> None:
+    """Pin the user's reads to the primary for READ_YOUR_WRITES_SECONDS"""
+    with _recent_writes_lock:
+        _recent_writes[user_id] = time.monotonic() + settings.READ_YOUR_WRITES_SECONDS
+        # Opportunistically drop expired entries
+        if len(_recent_writes) > 10000:
+            now = time.monotonic()
+            for key in [k for k, until in _recent_writes.items() if until < now]:
+                del _recent_writes[key]
+
+
+def recently_wrote(user_id: Optional[int]) -> bool:
+    if user_id is None:
+        return False
+    until = _recent_writes.get(user_id)
+    return until is not None and until > time.monotonic()
+
+
+def _pick_replica() -> Optional[Replica]:
+    for _ in range(len(replicas)):
+        replica = replicas[next(_round_robin) % len(replicas)]
+        if replica.healthy:
+            return replica
+    return None
+
+
+def get_read_db(current_user: Optional[Principal] = Depends(get_optional_user)):
+    """
+    Dependency to get a read-only database session.
+    Uses a healthy replica unless the user wrote recently.
+    """
+    replica = None
+    if replicas and not recently_wrote(current_user.id if current_user else None):
+        replica = _pick_replica()
+
+    db = replica.sessionmaker() if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def _probe_periodically() -> None:
+    while True:
+        await asyncio.gather(*(run_in_threadpool(replica.probe) for replica in replicas))
+        await asyncio.sleep(settings.REPLICA_HEALTH_CHECK_SECONDS)
+
+
+_health_task: Optional[asyncio.Task] = None
+
+
+def start_health_checks() -> None:
+    global _health_task
+    if replicas and _health_task is None:
+        _health_task = asyncio.get_running_loop().create_task(_probe_periodically())
+
+
+async def stop_health_checks() -> None:
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        try:
+            await _health_task
+        except asyncio.CancelledError:
+            pass
+        _health_task = None
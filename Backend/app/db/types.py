@@ -0,0 +1,54 @@
+import json
+import zlib
+from typing import Iterable
+from sqlalchemy import JSON, Index, LargeBinary, and_, func, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import JSONB
+
+# JSON arrays are stored as JSONB on PostgreSQL so they can be GIN indexed and
+# queried with containment (@>). Other dialects (SQLite in tests) keep plain JSON.
+JSONList = JSON().with_variant(JSONB(), "postgresql")
+
+
+def gin_index(name: str, column: str) -> Index:
+    """GIN index on a JSONB array column, only emitted on PostgreSQL"""
+    return Index(
+        name,
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column: "jsonb_path_ops"},
+    ).ddl_if(dialect="postgresql")
+
+
+def json_array_contains(column, values: Iterable[str], dialect_name: str):
+    """
+    Filter rows whose JSON array column contains every value in `values`.
+    Uses the indexed JSONB @> operator on PostgreSQL and json_each() elsewhere.
+    """
+    values = list(values)
+    if dialect_name == "postgresql":
+        return type_coerce(column, JSONB).contains(values)
+
+    clauses = []
+    for value in values:
+        elements = func.json_each(column).table_valued("value")
+        clauses.append(
+            select(1).select_from(elements).where(elements.c.value == value).exists()
+        )
+    return and_(*clauses)
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON value stored zlib-compressed in a binary column"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value).decode("utf-8"))
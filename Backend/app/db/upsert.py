@@ -0,0 +1,19 @@
+"""
+Dialect-specific INSERT constructs with ON CONFLICT support.
+
+PostgreSQL and SQLite both support INSERT ... ON CONFLICT (and RETURNING);
+`upsert_insert` returns the matching `insert` construct, or None for
+dialects that need a fallback.
+"""
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+_UPSERT_INSERTS = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+def upsert_insert(dialect_name: str):
+    """`insert` supporting on_conflict_do_nothing / on_conflict_do_update, or None"""
+    return _UPSERT_INSERTS.get(dialect_name)
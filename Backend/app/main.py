@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
@@ -9,15 +9,32 @@ from app.pfe.router import router as pfe_router
 from app.applications.router import router as applicant_router
 from app.dashboard.router import router as dashboard_router
 from app.notifications.router import router as notifications_router
+from app.analytics.analytics import router as analytics_router
 
 from app.api.routes.auth import router as auth_router
 from app.api.routes.student import router as student_router
 from app.api.routes.entreprise import router as enterprise_router
-from app.db.database import Base, engine
+from app.db.database import Base, engine, SessionLocal
+from app.db.migrations import run_migrations
+from app.core.metrics import collect_metrics, verify_metrics_token
+from app.db.replicas import replicas, mark_write, start_health_checks, stop_health_checks
+from app.services.skill_catalog import load_skill_catalog
+from app.services.match_features import refresh_stale_features
+from app.services.stats_rollup import ensure_stats_rollup
+from app.services.daily_stats import ensure_daily_stats
+from app.services.application_history import ensure_status_history
+from app.core.idempotency import purge_expired_idempotency_keys
+from app.services.refresh_tokens import purge_expired_refresh_tokens
+from app.notifications.coalescing import start_digests, stop_digests
+from app.notifications.outbox import dispatcher
+from app.notifications.stream import start_listener, stop_listener
+from app.services.notification_counters import ensure_notification_counters, start_reconciliation, stop_reconciliation
+from app.services.notification_retention import start_retention, stop_retention
 app = FastAPI(title="Student Profile API")
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app = FastAPI(
     title="PFE Match API",
@@ -32,8 +49,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Latest-Cursor"],
 )
 
+@app.middleware("http")
+async def track_writes_for_replica_routing(request: Request, call_next):
+    """Pin a user's reads to the primary right after they write (read-your-writes)"""
+    response = await call_next(request)
+    if replicas and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        # Set by the authentication dependencies once the token is verified
+        principal = getattr(request.state, "principal", None)
+        if principal is not None:
+            mark_write(principal.id)
+    return response
+
 # Create uploads directory
 os.makedirs("uploads", exist_ok=True)
 
@@ -45,6 +74,7 @@ app.include_router(pfe_router)
 app.include_router(applicant_router)
 app.include_router(dashboard_router)
 app.include_router(notifications_router)
+app.include_router(analytics_router)
 
 # Include routers
 app.include_router(auth_router)
@@ -52,10 +82,108 @@ app.include_router(student_router)
 app.include_router(enterprise_router)
 
 
+@app.on_event("startup")
+def load_skills():
+    """Load the skill alias lookup into memory, refresh stale match features and build missing statistics"""
+    db = SessionLocal()
+    try:
+        load_skill_catalog(db)
+        refresh_stale_features(db)
+        ensure_stats_rollup(db)
+        ensure_daily_stats(db)
+        ensure_status_history(db)
+        ensure_notification_counters(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def purge_idempotency_keys():
+    """Drop stored Idempotency-Key responses past their TTL"""
+    await purge_expired_idempotency_keys()
+
+
+@app.on_event("startup")
+async def start_replica_health_checks():
+    """Probe read replicas in the background"""
+    start_health_checks()
+
+
+@app.on_event("shutdown")
+async def stop_replica_health_checks():
+    await stop_health_checks()
+
+
+@app.on_event("startup")
+async def start_notification_listener():
+    """Receive notification wake-ups from other workers (PostgreSQL only)"""
+    start_listener()
+
+
+@app.on_event("shutdown")
+async def stop_notification_listener():
+    await stop_listener()
+
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    """Deliver queued notification pushes"""
+    dispatcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_outbox_dispatcher():
+    await dispatcher.stop()
+
+
+@app.on_event("startup")
+async def start_application_digests():
+    """Send periodic application digests in the "digest" notification mode"""
+    start_digests()
+
+
+@app.on_event("shutdown")
+async def stop_application_digests():
+    await stop_digests()
+
+
+@app.on_event("startup")
+async def start_counter_reconciliation():
+    """Periodically repair drifted unread notification counters"""
+    start_reconciliation()
+
+
+@app.on_event("shutdown")
+async def stop_counter_reconciliation():
+    await stop_reconciliation()
+
+
+@app.on_event("startup")
+async def start_notification_retention():
+    """Periodically archive old read notifications"""
+    start_retention()
+
+
+@app.on_event("shutdown")
+async def stop_notification_retention():
+    await stop_retention()
+
+
+@app.on_event("startup")
+async def purge_refresh_tokens():
+    """Drop expired and long-revoked refresh tokens"""
+    await purge_expired_refresh_tokens()
+
+
 @app.get("/")
 def root():
     return {"message": "Welcome to PFE Match API"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", dependencies=[Depends(verify_metrics_token)])
+def metrics():
+    """In-process runtime metrics (database pools, ...), see METRICS_TOKEN"""
+    return collect_metrics()
\ No newline at end of file
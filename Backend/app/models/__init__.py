@@ -4,6 +4,16 @@ from .entreprise import Enterprise
 from .pfe_listing import PFEListing
 from .application import Application
 from .match_preview import MatchPreview
+from .match_details import ApplicationMatchDetails
 from .notification import Notification, NotificationType
+from .notification_counter import NotificationCounter
+from .notification_outbox import NotificationOutbox
+from .notification_archive import NotificationArchive
+from .skill import Skill, SkillAlias, student_skills, pfe_skills
+from .pfe_stats import PFEStatsRollup, PFEFunnelCounters
+from .pfe_daily_stats import PFEDailyStats
+from .application_history import ApplicationStatusHistory
+from .idempotency_key import IdempotencyKey
+from .refresh_token import RefreshToken
 
-__all__ = ["User", "UserRole", "Student", "Enterprise", "PFEListing", "Application", "MatchPreview", "Notification", "NotificationType"]
\ No newline at end of file
+__all__ = ["User", "UserRole", "Student", "Enterprise", "PFEListing", "Application", "MatchPreview", "ApplicationMatchDetails", "Notification", "NotificationType", "NotificationCounter", "NotificationOutbox", "NotificationArchive", "Skill", "SkillAlias", "student_skills", "pfe_skills", "PFEStatsRollup", "PFEDailyStats", "PFEFunnelCounters", "ApplicationStatusHistory", "IdempotencyKey", "RefreshToken"]
\ No newline at end of file
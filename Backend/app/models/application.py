@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Text, Enum, JSON, func
+from sqlalchemy import Column, Integer, ForeignKey, DateTime, Text, Enum, Index, func
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 import enum
@@ -13,6 +13,13 @@ class ApplicationStatus(str, enum.Enum):
 
 class Application(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        # One application per student and listing; also serves duplicate checks
+        # and the student's own applications (leading student_id)
+        Index("uq_applications_student_id_pfe_listing_id", "student_id", "pfe_listing_id", unique=True),
+        # Per-listing applicant counts, top applicants and average match
+        Index("ix_applications_pfe_listing_id_match_rate", "pfe_listing_id", "match_rate"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -22,10 +29,6 @@ class Application(Base):
 
     # Application data
     match_rate = Column(Integer, default=0)
-    match_explanation = Column(Text, nullable=True)
-    matched_skills = Column(JSON, nullable=True, default=list)
-    missing_skills = Column(JSON, nullable=True, default=list)
-    recommendations = Column(Text, nullable=True)
     status = Column(Enum(ApplicationStatus), default=ApplicationStatus.PENDING, nullable=False)
     cover_letter = Column(Text, nullable=True)
     reviewer_notes = Column(Text, nullable=True)
@@ -36,3 +39,10 @@ class Application(Base):
     # Relationships
     student = relationship("Student", backref="applications")
     pfe_listing = relationship("PFEListing", back_populates="applications")
+    # LLM explanation, stored compressed in application_match_details
+    match_details = relationship(
+        "ApplicationMatchDetails",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, Index, func
+from sqlalchemy.orm import relationship
+from app.db.database import Base
+from app.models.application import ApplicationStatus
+
+
+class ApplicationStatusHistory(Base):
+    """
+    Append-only log of application status transitions. The first row of an
+    application has no from_status and records its creation.
+    """
+    __tablename__ = "application_status_history"
+    __table_args__ = (
+        Index("ix_application_status_history_application_id_changed_at", "application_id", "changed_at"),
+        Index("ix_application_status_history_pfe_listing_id_changed_at", "pfe_listing_id", "changed_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    application_id = Column(Integer, ForeignKey("applications.id", ondelete="CASCADE"), nullable=False)
+    pfe_listing_id = Column(Integer, ForeignKey("pfe_listings.id", ondelete="CASCADE"), nullable=False)
+    from_status = Column(Enum(ApplicationStatus), nullable=True)
+    to_status = Column(Enum(ApplicationStatus), nullable=False)
+    # User who made the change, when known
+    changed_by_user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    application = relationship("Application", backref="status_history")
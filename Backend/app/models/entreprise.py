@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from app.db.database import Base
+from app.db.types import JSONList, gin_index
 
 
 class Enterprise(Base):
     """Enterprise profile model"""
     __tablename__ = "entreprise"
+    __table_args__ = (gin_index("ix_entreprise_technologies_used_gin", "technologies_used"),)
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
@@ -19,7 +21,7 @@ class Enterprise(Base):
     location = Column(String(200), nullable=True)
     employee_count = Column(String(50), nullable=True)
     company_description = Column(Text, nullable=True)
-    technologies_used = Column(JSON, nullable=True, default=list)
+    technologies_used = Column(JSONList, nullable=True, default=list)
     
     # Additional fields
     website = Column(String(500), nullable=True)
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from app.db.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Idempotency-Key claimed by a user's request, see app.core.idempotency.
+    The response is empty while the original request is still running.
+    """
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    # "METHOD /path" of the request that claimed the key
+    endpoint = Column(String(255), nullable=False)
+    # SHA-256 of the path, query string and body, see _request_fingerprint
+    request_hash = Column(String(64), nullable=True)
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from app.db.database import Base
+from app.db.types import CompressedJSON
+
+
+class ApplicationMatchDetails(Base):
+    """
+    LLM match explanation of an application, kept out of the applications
+    table and only loaded by the endpoints that show it.
+    """
+    __tablename__ = "application_match_details"
+
+    application_id = Column(Integer, ForeignKey("applications.id", ondelete="CASCADE"), primary_key=True)
+    # {"explanation", "matched_skills", "missing_skills", "recommendations"},
+    # see app.services.matching_service.match_details_from_result
+    payload = Column(CompressedJSON, nullable=False)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.database import Base
+from app.db.types import CompressedJSON
 
 
 class MatchPreview(Base):
@@ -10,6 +11,9 @@ class MatchPreview(Base):
     This prevents recalculating the match score every time a student opens a PFE detail.
     """
     __tablename__ = "match_previews"
+    __table_args__ = (
+        Index("ix_match_previews_student_id_pfe_listing_id", "student_id", "pfe_listing_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
@@ -17,10 +21,8 @@ class MatchPreview(Base):
     
     # Match score data
     match_score = Column(Float, nullable=False)
-    explanation = Column(Text, nullable=True)
-    matched_skills = Column(JSON, nullable=True)
-    missing_skills = Column(JSON, nullable=True)
-    recommendations = Column(Text, nullable=True)
+    # Compressed explanation, same shape as ApplicationMatchDetails.payload
+    payload = Column(CompressedJSON, nullable=True)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
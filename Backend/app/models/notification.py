@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 import enum
 from app.db.database import Base
 
@@ -16,7 +16,7 @@ class Notification(Base):
     """Notification model for user notifications"""
     __tablename__ = "notifications"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
@@ -27,7 +27,40 @@ class Notification(Base):
     pfe_listing_id = Column(Integer, ForeignKey("pfe_listings.id", ondelete="SET NULL"), nullable=True)
     application_id = Column(Integer, ForeignKey("applications.id", ondelete="SET NULL"), nullable=True)
     
+    # Events merged into this notification by app.notifications.coalescing (NULL for one)
+    coalesced_count = Column(Integer, nullable=True)
+    # Periodic application digest sent by app.notifications.coalescing
+    is_digest = Column(Boolean, nullable=False, default=False, server_default=false())
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Keyset-paginated feed, newest first (the unread feed uses the partial index)
+        Index("ix_notifications_user_id_created_at_id", user_id, created_at, id),
+        # Unread counts and unread feed
+        Index(
+            "ix_notifications_user_id_created_at_unread",
+            user_id,
+            created_at,
+            postgresql_where=is_read == False,
+            sqlite_where=is_read == False,
+        ),
+        # Latest digest per enterprise user
+        Index(
+            "ix_notifications_user_id_created_at_digest",
+            user_id,
+            created_at,
+            postgresql_where=is_digest == True,
+            sqlite_where=is_digest == True,
+        ),
+        # Retention: read notifications by age
+        Index(
+            "ix_notifications_created_at_read",
+            created_at,
+            postgresql_where=is_read == True,
+            sqlite_where=is_read == True,
+        ),
+    )
     
     # Relationships
     user = relationship("User", backref="notifications")
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.db.database import Base
+from app.db.types import CompressedJSON
+
+
+class NotificationArchive(Base):
+    """
+    Read notifications moved out of `notifications` by
+    app.services.notification_retention. On PostgreSQL the table is
+    range-partitioned by month of `archived_at`, so expired archives are
+    dropped a partition at a time.
+    """
+    __tablename__ = "notifications_archive"
+    __table_args__ = (
+        Index("ix_notifications_archive_user_id_created_at", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (archived_at)"},
+    )
+
+    # Id of the notification in `notifications`
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    # Part of the key because PostgreSQL requires the partition key in it
+    archived_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    # {"title", "message", "type", "pfe_listing_id", "application_id", "coalesced_count"}
+    payload = Column(CompressedJSON, nullable=False)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from app.db.database import Base
+
+
+class NotificationCounter(Base):
+    """
+    Unread notifications per user, maintained by app.services.notification_counters
+    whenever a notification is created or marked as read. `feed_version` grows
+    with every change to the user's notifications and versions the feed ETag.
+    """
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    feed_version = Column(Integer, nullable=False, default=0, server_default="0")
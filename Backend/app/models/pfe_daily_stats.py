@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Index
+from app.db.database import Base
+
+
+class PFEDailyStats(Base):
+    """
+    Daily application activity per enterprise and PFE listing (UTC days),
+    maintained incrementally by app.services.daily_stats.
+    """
+    __tablename__ = "pfe_daily_stats"
+    __table_args__ = (
+        # Enterprise-wide time ranges across all of its listings
+        Index("ix_pfe_daily_stats_enterprise_id_day", "enterprise_id", "day"),
+    )
+
+    enterprise_id = Column(Integer, ForeignKey("entreprise.id", ondelete="CASCADE"), primary_key=True)
+    pfe_listing_id = Column(Integer, ForeignKey("pfe_listings.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    applications_received = Column(Integer, nullable=False, default=0, server_default="0")
+    status_transitions = Column(Integer, nullable=False, default=0, server_default="0")
+    # Match rates of the applications received that day
+    match_rate_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    match_rate_count = Column(Integer, nullable=False, default=0, server_default="0")
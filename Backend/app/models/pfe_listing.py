@@ -7,11 +7,13 @@ from sqlalchemy import (
     JSON,
     DateTime,
     Enum,
+    Index,
     func,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 import enum
 from app.db.database import Base
+from app.db.types import JSONList, gin_index
 
 
 class PFEStatus(str, enum.Enum):
@@ -26,17 +28,35 @@ class PFEListing(Base):
     title = Column(String, nullable=False, index=True)
     category = Column(String, nullable=False)
     duration = Column(String, nullable=False)
-    description = Column(Text)
+    # Wide text, loaded on first access; list queries should not need it
+    description = deferred(Column(Text))
     department = Column(String)
     location = Column(String)
     status = Column(Enum(PFEStatus), default=PFEStatus.OPEN, nullable=False)
-    skills = Column(JSON, nullable=True, default=list)
-    enterprise_id = Column(Integer, ForeignKey("entreprise.id", ondelete="CASCADE"))
+    skills = Column(JSONList, nullable=True, default=list)
+    enterprise_id = Column(Integer, ForeignKey("entreprise.id", ondelete="CASCADE"), index=True)
     posted_date = Column(DateTime(timezone=True), server_default=func.now())
     deadline = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        gin_index("ix_pfe_listings_skills_gin", "skills"),
+        Index("ix_pfe_listings_status_posted_date", status, posted_date),
+        # Open listings, most recent first
+        Index(
+            "ix_pfe_listings_posted_date_open",
+            posted_date,
+            postgresql_where=status == PFEStatus.OPEN,
+            sqlite_where=status == PFEStatus.OPEN,
+        ),
+    )
+
+    # Precomputed match features, see app.services.match_features
+    skill_ids = Column(JSONList, nullable=True)
+    term_vector = Column(JSON, nullable=True)
+    features_version = Column(Integer, nullable=True)
+
     # Relations
     enterprise = relationship("Enterprise", backref="pfe_listings")
     applications = relationship(
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey
+from app.db.database import Base
+
+
+class PFEStatsRollup(Base):
+    """
+    Application statistics per enterprise and PFE listing, maintained
+    incrementally by app.services.stats_rollup whenever an application is
+    created, changes status or is rescored.
+    """
+    __tablename__ = "pfe_stats_rollup"
+
+    enterprise_id = Column(Integer, ForeignKey("entreprise.id", ondelete="CASCADE"), primary_key=True)
+    pfe_listing_id = Column(Integer, ForeignKey("pfe_listings.id", ondelete="CASCADE"), primary_key=True)
+
+    # Applications per current status
+    pending = Column(Integer, nullable=False, default=0, server_default="0")
+    reviewed = Column(Integer, nullable=False, default=0, server_default="0")
+    shortlisted = Column(Integer, nullable=False, default=0, server_default="0")
+    interview = Column(Integer, nullable=False, default=0, server_default="0")
+    accepted = Column(Integer, nullable=False, default=0, server_default="0")
+    rejected = Column(Integer, nullable=False, default=0, server_default="0")
+
+    total_applications = Column(Integer, nullable=False, default=0, server_default="0")
+    top_applicants = Column(Integer, nullable=False, default=0, server_default="0")
+    match_rate_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    match_rate_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class PFEFunnelCounters(Base):
+    """
+    Recruitment funnel per PFE listing, maintained incrementally by
+    app.services.application_history. `reached_<stage>` counts applications
+    that got at least that far through
+    pending → reviewed → shortlisted → interview → accepted.
+    """
+    __tablename__ = "pfe_funnel_counters"
+
+    pfe_listing_id = Column(Integer, ForeignKey("pfe_listings.id", ondelete="CASCADE"), primary_key=True)
+
+    reached_pending = Column(Integer, nullable=False, default=0, server_default="0")
+    reached_reviewed = Column(Integer, nullable=False, default=0, server_default="0")
+    reached_shortlisted = Column(Integer, nullable=False, default=0, server_default="0")
+    reached_interview = Column(Integer, nullable=False, default=0, server_default="0")
+    reached_accepted = Column(Integer, nullable=False, default=0, server_default="0")
+    rejected = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # First accept/reject decision per application and the time it took
+    decisions = Column(Integer, nullable=False, default=0, server_default="0")
+    decision_seconds_sum = Column(BigInteger, nullable=False, default=0, server_default="0")
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy.orm import relationship
+from app.db.database import Base
+
+
+# Association tables between profiles/listings and canonical skills.
+# The composite primary key serves lookups by owner; the skill_id index serves
+# reverse lookups ("who has / which listings require skill X").
+student_skills = Table(
+    "student_skills",
+    Base.metadata,
+    Column("student_id", Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True),
+    Column("skill_id", Integer, ForeignKey("skills.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+pfe_skills = Table(
+    "pfe_skills",
+    Base.metadata,
+    Column("pfe_listing_id", Integer, ForeignKey("pfe_listings.id", ondelete="CASCADE"), primary_key=True),
+    Column("skill_id", Integer, ForeignKey("skills.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
+class Skill(Base):
+    """Canonical skill in the catalogue"""
+    __tablename__ = "skills"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    # Normalized lookup key, see app.services.skill_catalog.normalize_skill
+    key = Column(String(100), unique=True, nullable=False, index=True)
+
+    aliases = relationship("SkillAlias", back_populates="skill", cascade="all, delete-orphan")
+
+
+class SkillAlias(Base):
+    """Alternative spelling of a skill, stored as a normalized key"""
+    __tablename__ = "skill_aliases"
+
+    alias = Column(String(100), primary_key=True)
+    skill_id = Column(Integer, ForeignKey("skills.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    skill = relationship("Skill", back_populates="aliases")
@@ -1,11 +1,16 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from app.db.database import Base
+from app.db.types import JSONList, gin_index
 
 
 class Student(Base):
     """Student profile model"""
     __tablename__ = "students"
+    __table_args__ = (
+        gin_index("ix_students_skills_gin", "skills"),
+        gin_index("ix_students_technologies_gin", "technologies"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
@@ -18,7 +23,7 @@ class Student(Base):
     university = Column(String(200), nullable=True)
     profile_picture = Column(String(500), nullable=True)
     resume_url = Column(String(500), nullable=True)
-    short_bio = Column(Text, nullable=True)
+    short_bio = deferred(Column(Text, nullable=True))
     desired_job_role = Column(String(100), nullable=True)
     
     # Social/Portfolio Links
@@ -26,12 +31,17 @@ class Student(Base):
     github_url = Column(String(500), nullable=True)
     portfolio_url = Column(String(500), nullable=True)
     
-    # Skills and technologies (stored as JSON for PostgreSQL compatibility)
-    skills = Column(JSON, nullable=True, default=list)
-    technologies = Column(JSON, nullable=True, default=list)
+    # Skills and technologies (stored as JSONB on PostgreSQL, GIN indexed)
+    skills = Column(JSONList, nullable=True, default=list)
+    technologies = Column(JSONList, nullable=True, default=list)
     
     # Resume parsing status
     resume_parsed = Column(Boolean, default=False)
+
+    # Precomputed match features, see app.services.match_features
+    skill_ids = Column(JSONList, nullable=True)
+    term_vector = Column(JSON, nullable=True)
+    features_version = Column(Integer, nullable=True)
     
     # Relationship
     user = relationship("User", back_populates="student")
@@ -0,0 +1,192 @@
+"""
+Coalescing and digests for "new application" notifications.
+
+A popular listing would otherwise leave its enterprise one notification per
+applicant. NEW_APPLICATION_NOTIFICATIONS selects how they are sent:
+
+- "each": one notification per application.
+- "coalesce": an application to a listing whose latest new-application
+  notification is still unread and less than
+  NOTIFICATION_COALESCE_WINDOW_SECONDS old updates that notification in
+  place ("12 new applications for X") and moves it to the top of the feed.
+- "digest": nothing is sent on apply. Every
+  NOTIFICATION_DIGEST_INTERVAL_SECONDS each enterprise gets one summary of
+  the applications received since its previous digest. Workers check for
+  due digests periodically; it can also be run by hand:
+
+    python -m app.notifications.coalescing
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models import Application, Enterprise, Notification, NotificationType, PFEListing
+from app.notifications.router import create_notifications
+from app.notifications.stream import notify_user
+from app.services.notification_counters import record_feed_change
+
+# How often workers look for enterprises with a digest due
+DIGEST_CHECK_SECONDS = 300
+# Serializes digest runs of several workers (PostgreSQL advisory lock key)
+DIGEST_LOCK_KEY = 4_810_771
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_application_notification(
+    db: Session,
+    user_id: int,
+    pfe: PFEListing,
+    student_name: str,
+    application_id: int
+) -> Optional[Notification]:
+    """
+    Notification telling an enterprise user about a new application, to be
+    passed to create_notifications. Returns None when the application was
+    merged into an existing notification or is left to the digest.
+    """
+    mode = settings.NEW_APPLICATION_NOTIFICATIONS
+    if mode == "digest":
+        return None
+    if mode == "coalesce" and _coalesce(db, user_id, pfe, application_id):
+        return None
+    return Notification(
+        user_id=user_id,
+        title="New Application Received",
+        message=f"{student_name} has applied to your PFE listing: {pfe.title}",
+        type=NotificationType.NEW_APPLICATION,
+        pfe_listing_id=pfe.id,
+        application_id=application_id
+    )
+
+
+def _coalesce(db: Session, user_id: int, pfe: PFEListing, application_id: int) -> bool:
+    """Merge the application into the listing's rolling notification, if there is one"""
+    window_start = _utcnow() - timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW_SECONDS)
+    rolling = db.execute(
+        select(Notification.id, Notification.coalesced_count)
+        .where(
+            Notification.user_id == user_id,
+            Notification.is_read == False,
+            Notification.created_at >= window_start,
+            Notification.pfe_listing_id == pfe.id,
+            Notification.type == NotificationType.NEW_APPLICATION,
+        )
+        .order_by(Notification.created_at.desc())
+        .limit(1)
+        .with_for_update()
+    ).first()
+    if rolling is None:
+        return False
+
+    count = (rolling.coalesced_count or 1) + 1
+    # Still unread: a concurrent mark-as-read starts a new notification instead
+    updated = db.execute(
+        update(Notification)
+        .where(Notification.id == rolling.id, Notification.is_read == False)
+        .values(
+            title="New Applications Received",
+            message=f"{count} new applications to your PFE listing: {pfe.title}",
+            application_id=application_id,
+            coalesced_count=count,
+            created_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        return False
+
+    # Moves up the feed (new ETag) and is re-sent to open streams
+    record_feed_change(db, user_id)
+    notify_user(db, user_id, [rolling.id])
+    return True
+
+
+def send_digests(db: Session) -> int:
+    """Send the due application digests. Returns the number sent."""
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(DIGEST_LOCK_KEY))):
+            return 0
+
+    due_before = _utcnow() - timedelta(seconds=settings.NOTIFICATION_DIGEST_INTERVAL_SECONDS)
+    last_digest = (
+        select(func.max(Notification.created_at))
+        .where(Notification.user_id == Enterprise.user_id, Notification.is_digest == True)
+        .correlate(Enterprise)
+        .scalar_subquery()
+    )
+    since = func.coalesce(last_digest, due_before)
+    rows = db.execute(
+        select(Enterprise.user_id, PFEListing.title, func.count(Application.id).label("applications"))
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .join(Enterprise, Enterprise.id == PFEListing.enterprise_id)
+        .where(since <= due_before, Application.created_at > since)
+        .group_by(Enterprise.user_id, PFEListing.id, PFEListing.title)
+        .order_by(Enterprise.user_id, func.count(Application.id).desc())
+    ).all()
+
+    per_user = {}
+    for row in rows:
+        per_user.setdefault(row.user_id, []).append(row)
+
+    digests = []
+    for user_id, listings in per_user.items():
+        total = sum(listing.applications for listing in listings)
+        breakdown = ", ".join(f"{listing.title} ({listing.applications})" for listing in listings)
+        digests.append(Notification(
+            user_id=user_id,
+            title="Your Application Digest",
+            message=f"{total} new application{'s' if total != 1 else ''}: {breakdown}",
+            type=NotificationType.NEW_APPLICATION,
+            is_digest=True,
+        ))
+    create_notifications(db, digests)
+    db.commit()
+    return len(digests)
+
+
+def _send_digests() -> int:
+    db = SessionLocal()
+    try:
+        return send_digests(db)
+    finally:
+        db.close()
+
+
+async def _send_digests_periodically() -> None:
+    while True:
+        await asyncio.sleep(DIGEST_CHECK_SECONDS)
+        try:
+            await run_in_threadpool(_send_digests)
+        except Exception as e:
+            print(f"Sending application digests failed: {e}")
+
+
+_digest_task: Optional[asyncio.Task] = None
+
+
+def start_digests() -> None:
+    global _digest_task
+    if settings.NEW_APPLICATION_NOTIFICATIONS == "digest" and _digest_task is None:
+        _digest_task = asyncio.get_running_loop().create_task(_send_digests_periodically())
+
+
+async def stop_digests() -> None:
+    global _digest_task
+    if _digest_task is not None:
+        _digest_task.cancel()
+        try:
+            await _digest_task
+        except asyncio.CancelledError:
+            pass
+        _digest_task = None
+
+
+if __name__ == "__main__":
+    print(f"Sent {_send_digests()} application digests")
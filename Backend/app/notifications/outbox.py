@@ -0,0 +1,130 @@
+"""
+Transactional outbox for notification push delivery.
+
+`enqueue` writes one `notification_outbox` row per new notification in the
+transaction that creates it, so a notification is pushed if and only if it
+commits. Each worker runs a dispatcher that drains the outbox: it is woken
+right after such a commit and otherwise polls every
+NOTIFICATION_OUTBOX_POLL_SECONDS, picking up rows left behind by workers
+that stopped before delivering.
+
+Delivery wakes the recipients' notification streams and drops their cached
+unread counts in this worker and, on PostgreSQL, NOTIFYs the other workers
+(see app.notifications.stream). Dispatchers of several workers claim rows
+with SKIP LOCKED, so each row is delivered once.
+"""
+import asyncio
+from typing import List, Optional
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.models import Notification, NotificationOutbox
+from app.notifications.stream import PG_CHANNEL, WORKER_ID, wake_user
+
+_PENDING_KEY = "notification_outbox"
+
+
+class OutboxDispatcher:
+    """Background task draining the outbox of this process"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.dispatched = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def kick(self) -> None:
+        """Drain now instead of at the next poll; safe to call from any thread"""
+        if self._task is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.NOTIFICATION_OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.drain_batch() == settings.NOTIFICATION_OUTBOX_BATCH_SIZE:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"Notification outbox dispatch failed: {e}")
+
+    async def drain_batch(self) -> int:
+        """Deliver and delete one batch of outbox rows. Returns the number delivered."""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(NotificationOutbox.id, NotificationOutbox.user_id)
+                .order_by(NotificationOutbox.id)
+                .limit(settings.NOTIFICATION_OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                return 0
+
+            user_ids = {row.user_id for row in rows}
+            if db.get_bind().dialect.name == "postgresql":
+                for user_id in user_ids:
+                    await db.execute(select(func.pg_notify(PG_CHANNEL, f"{WORKER_ID}:{user_id}")))
+            await db.execute(
+                delete(NotificationOutbox).where(NotificationOutbox.id.in_([row.id for row in rows]))
+            )
+            await db.commit()
+
+        for user_id in user_ids:
+            wake_user(user_id)
+        self.dispatched += len(rows)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "dispatched": self.dispatched,
+            "failures": self.failures,
+            "dispatcher": "running" if self._task and not self._task.done() else "off",
+        }
+
+
+dispatcher = OutboxDispatcher()
+register_metrics("notification_outbox", dispatcher.stats)
+
+
+def enqueue(db: Session, notifications: List[Notification]) -> None:
+    """Add outbox rows for flushed notifications to the caller's transaction"""
+    db.execute(
+        insert(NotificationOutbox),
+        [{"notification_id": n.id, "user_id": n.user_id} for n in notifications],
+    )
+    db.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _kick_after_commit(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        dispatcher.kick()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
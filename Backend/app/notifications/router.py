@@ -1,11 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Set, Tuple
 from pydantic import BaseModel
-from datetime import datetime
-from app.models import User, Notification, NotificationType
-from app.core.dependencies import get_current_user
-from app.db.database import get_db
+from datetime import datetime, timedelta
+from app.models import Notification, NotificationType
+from app.core.config import settings
+from app.core.dependencies import Principal, get_current_user, oauth2_scheme, principal_from_token_payload
+from app.core.security import create_access_token, decode_token
+from app.db.database import AsyncSessionLocal, SessionLocal, get_db
+from app.db.replicas import get_read_db
+from app.notifications.outbox import enqueue
+from app.notifications.stream import broker, notify_user
+from app.services.notification_counters import (
+    get_feed_version,
+    get_unread_count as read_unread_count,
+    record_unread_delta,
+)
 
 router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
 
@@ -28,75 +48,335 @@ class UnreadCountResponse(BaseModel):
     count: int
 
 
+NOTIFICATION_COLUMNS = (
+    Notification.id,
+    Notification.title,
+    Notification.message,
+    Notification.type,
+    Notification.is_read,
+    Notification.pfe_listing_id,
+    Notification.application_id,
+    Notification.created_at,
+)
+
+# Notifications sent per stream wake-up; the rest follow immediately
+STREAM_BATCH_SIZE = 50
+# Scope claim of notification stream tickets
+STREAM_TICKET_SCOPE = "notification_stream"
+MAX_PAGE_SIZE = 100
+
+
+def _notification_response(n) -> dict:
+    return {
+        "id": n.id,
+        "title": n.title,
+        "message": n.message,
+        "type": n.type.value if hasattr(n.type, "value") else n.type,
+        "is_read": n.is_read,
+        "pfe_listing_id": n.pfe_listing_id,
+        "application_id": n.application_id,
+        "created_at": n.created_at,
+    }
+
+
+def _encode_cursor(n) -> str:
+    raw = f"{n.created_at.isoformat()}|{n.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, notification_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _feed_position(db: Session, created_at, notification_id):
+    """(created_at, id) row value for keyset comparisons"""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps timestamps as text, with or without fractional
+        # seconds; compare them in one format
+        created_at = func.strftime("%Y-%m-%d %H:%M:%f", created_at)
+    return tuple_(created_at, notification_id)
+
+
+def _feed_etag(user_id: int, version: int, request: Request) -> str:
+    params = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    return f'W/"{user_id}.{version}.{params}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    # Weak comparison: W/"x" and "x" match
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
 @router.get("", response_model=List[NotificationResponse])
 def get_notifications(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-    limit: int = 50,
-    unread_only: bool = False
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    unread_only: bool = False,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
 ):
     """
-    Get notifications for the current user.
+    Get notifications for the current user, newest first.
+
+    Pages are keyset-paginated on (created_at, id): pass the X-Next-Cursor
+    header of a page as `before` to get the next one. Pass the
+    X-Latest-Cursor header of the newest page as `since` to get only
+    notifications created after it (page through a large delta with both).
+
+    Responses carry an ETag derived from the user's feed version; a request
+    with a matching If-None-Match gets 304 without the feed being queried.
     """
-    query = db.query(Notification).filter(Notification.user_id == current_user.id)
+    # Version first, then the feed, from the same session: a replica that
+    # lags behind can then only serve an older version, never an older feed
+    # under a newer version
+    etag = _feed_etag(current_user.id, get_feed_version(db, current_user.id), request)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    query = select(*NOTIFICATION_COLUMNS).where(Notification.user_id == current_user.id)
     
     if unread_only:
-        query = query.filter(Notification.is_read == False)
+        query = query.where(Notification.is_read == False)
+    keyset = _feed_position(db, Notification.created_at, Notification.id)
+    if before:
+        query = query.where(keyset < _feed_position(db, *_decode_cursor(before)))
+    if since:
+        query = query.where(keyset > _feed_position(db, *_decode_cursor(since)))
     
-    notifications = query.order_by(Notification.created_at.desc()).limit(limit).all()
+    # One extra row tells whether another page follows
+    notifications = db.execute(
+        query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1)
+    ).all()
     
-    return [
-        {
-            "id": n.id,
-            "title": n.title,
-            "message": n.message,
-            "type": n.type.value if hasattr(n.type, "value") else n.type,
-            "is_read": n.is_read,
-            "pfe_listing_id": n.pfe_listing_id,
-            "application_id": n.application_id,
-            "created_at": n.created_at,
-        }
-        for n in notifications
-    ]
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(notifications[-1])
+    if notifications:
+        headers["X-Latest-Cursor"] = _encode_cursor(notifications[0])
+    response.headers.update(headers)
+    
+    return [_notification_response(n) for n in notifications]
 
 
 @router.get("/unread-count", response_model=UnreadCountResponse)
 def get_unread_count(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get count of unread notifications for the current user.
+    Reads the user's maintained counter (app.services.notification_counters).
     """
-    count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
-    
-    return {"count": count}
+    return {"count": read_unread_count(db, current_user.id)}
+
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(jsonable_encoder(data))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stream_events(user_id: int, cursor: Optional[int], updated_ids: Set[int]):
+    """
+    SSE chunk with the user's notifications after `cursor`, the already sent
+    ones in `updated_ids` again and their unread count. Returns (new cursor,
+    chunk, whether more notifications are pending). A stream without a cursor
+    starts after the user's latest notification.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = []
+        updated = []
+        if cursor is not None and updated_ids:
+            # Notifications after the cursor are sent as new ones below
+            updated = (await db.execute(
+                select(*NOTIFICATION_COLUMNS)
+                .where(
+                    Notification.user_id == user_id,
+                    Notification.id.in_(updated_ids),
+                    Notification.id <= cursor,
+                )
+                .order_by(Notification.id)
+            )).all()
+        if cursor is None:
+            cursor = await db.scalar(
+                select(func.max(Notification.id)).where(Notification.user_id == user_id)
+            ) or 0
+        else:
+            rows = (await db.execute(
+                select(*NOTIFICATION_COLUMNS)
+                .where(Notification.user_id == user_id, Notification.id > cursor)
+                .order_by(Notification.id)
+                .limit(STREAM_BATCH_SIZE)
+            )).all()
+        unread = await db.run_sync(read_unread_count, user_id)
+
+    chunks = [_sse("notification_updated", _notification_response(n)) for n in updated]
+    chunks.extend(_sse("notification", _notification_response(n), n.id) for n in rows)
+    chunks.append(_sse("unread_count", {"count": unread}))
+    if rows:
+        cursor = rows[-1].id
+    return cursor, "".join(chunks), len(rows) == STREAM_BATCH_SIZE
+
+
+async def _event_stream(request: Request, user_id: int, cursor: Optional[int], expires_at: Optional[float]):
+    subscription = broker.subscribe(user_id)
+    wake = subscription.wake
+    heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+    try:
+        yield f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n"
+        # Catch up on connect
+        wake.set()
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                timeout = min(timeout, expires_at - time.time())
+                if timeout <= 0:
+                    # Access token expired: end the stream so the client
+                    # reconnects with a fresh token
+                    break
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+
+            wake.clear()
+            cursor, chunk, more = await _stream_events(user_id, cursor, subscription.take_updated())
+            if more:
+                wake.set()
+            yield chunk
+    finally:
+        broker.unsubscribe(user_id, subscription)
+
+
+class StreamTicketResponse(BaseModel):
+    ticket: str
+    expires_in: int
+
+
+@router.post("/stream-ticket", response_model=StreamTicketResponse)
+def create_stream_ticket(
+    token: str = Depends(oauth2_scheme),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Short-lived ticket opening the notification stream, so the access token
+    itself never appears in a URL. Tickets are valid for
+    NOTIFICATION_STREAM_TICKET_SECONDS and are accepted nowhere else.
+    """
+    ticket = create_access_token(
+        {
+            "sub": str(current_user.id),
+            "scope": STREAM_TICKET_SCOPE,
+            # The stream still ends when the access token that asked for it expires
+            "session_exp": decode_token(token).get("exp"),
+        },
+        expires_delta=timedelta(seconds=settings.NOTIFICATION_STREAM_TICKET_SECONDS),
+    )
+    return {"ticket": ticket, "expires_in": settings.NOTIFICATION_STREAM_TICKET_SECONDS}
+
+
+def _stream_principal(payload: dict, scope: Optional[str]) -> Principal:
+    db = SessionLocal()
+    try:
+        return principal_from_token_payload(payload, db, scope)
+    finally:
+        db.close()
+
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    ticket: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-sent events for the current user: a `notification` event (with
+    the notification id as event id) for each new notification, a
+    `notification_updated` event when an already sent notification changes
+    in place (see app.notifications.coalescing) and an `unread_count` event
+    whenever the count may have changed, plus a heartbeat comment every
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS.
+
+    EventSource cannot send headers, so browsers pass a `ticket` from
+    POST /stream-ticket instead; other clients may send the access token as
+    a Bearer header. Reconnects resume after the Last-Event-ID header or the
+    `last_event_id` parameter. The stream ends when the access token
+    expires; clients reconnect with a fresh ticket.
+    """
+    if ticket:
+        payload = decode_token(ticket)
+        current_user = await run_in_threadpool(_stream_principal, payload, STREAM_TICKET_SCOPE)
+        expires_at = payload.get("session_exp")
+    else:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        payload = decode_token(token)
+        current_user = await run_in_threadpool(_stream_principal, payload, None)
+        expires_at = payload.get("exp")
+
+    resume_from = last_event_id_header or last_event_id
+    cursor = int(resume_from) if resume_from and resume_from.isdigit() else None
+
+    return StreamingResponse(
+        _event_stream(request, current_user.id, cursor, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/{notification_id}/read")
 def mark_as_read(
     notification_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Mark a specific notification as read.
     """
-    notification = db.query(Notification).filter(
+    # Conditional update so concurrent requests decrement the counter once
+    updated = db.query(Notification).filter(
         Notification.id == notification_id,
-        Notification.user_id == current_user.id
-    ).first()
+        Notification.user_id == current_user.id,
+        Notification.is_read == False
+    ).update({"is_read": True}, synchronize_session=False)
     
-    if not notification:
+    if updated:
+        record_unread_delta(db, current_user.id, -updated)
+        notify_user(db, current_user.id)
+    elif not db.query(Notification.id).filter(
+        Notification.id == notification_id,
+        Notification.user_id == current_user.id
+    ).first():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Notification not found"
         )
-    
-    notification.is_read = True
     db.commit()
     
     return {"message": "Notification marked as read"}
@@ -105,21 +385,46 @@ def mark_as_read(
 @router.post("/read-all")
 def mark_all_as_read(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Mark all notifications as read for the current user.
     """
-    db.query(Notification).filter(
+    updated = db.query(Notification).filter(
         Notification.user_id == current_user.id,
         Notification.is_read == False
-    ).update({"is_read": True})
+    ).update({"is_read": True}, synchronize_session=False)
+    if updated:
+        record_unread_delta(db, current_user.id, -updated)
+        notify_user(db, current_user.id)
     
     db.commit()
     
     return {"message": "All notifications marked as read"}
 
 
+def create_notifications(db: Session, notifications: List[Notification]) -> List[Notification]:
+    """
+    Add notifications to the caller's transaction in one flush, together with
+    the recipients' unread counters and outbox rows for push delivery.
+    Nothing is committed; the notifications are pushed once the caller commits.
+    """
+    if not notifications:
+        return notifications
+
+    db.add_all(notifications)
+    db.flush(notifications)
+
+    per_user = {}
+    for notification in notifications:
+        per_user[notification.user_id] = per_user.get(notification.user_id, 0) + 1
+    for user_id, count in per_user.items():
+        record_unread_delta(db, user_id, count)
+    enqueue(db, notifications)
+
+    return notifications
+
+
 def create_notification(
     db: Session,
     user_id: int,
@@ -127,11 +432,14 @@ def create_notification(
     message: str,
     notification_type: NotificationType = NotificationType.SYSTEM,
     pfe_listing_id: Optional[int] = None,
-    application_id: Optional[int] = None
+    application_id: Optional[int] = None,
+    commit: bool = True
 ) -> Notification:
     """
     Helper function to create a notification.
-    Can be called from other modules.
+    Can be called from other modules. With commit=False the notification is
+    saved with the caller's transaction; prefer that, or create_notifications
+    for several at once, over a commit of its own.
     """
     notification = Notification(
         user_id=user_id,
@@ -142,8 +450,8 @@ def create_notification(
         application_id=application_id
     )
     
-    db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    create_notifications(db, [notification])
+    if commit:
+        db.commit()
     
     return notification
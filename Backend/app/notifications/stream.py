@@ -0,0 +1,177 @@
+"""
+Push delivery for notifications.
+
+`notify_user` marks a user as having a changed unread count, optionally
+with notifications updated in place; once the session commits, the user's
+cached unread count is dropped and every open notification stream of that
+user (GET /api/notifications/stream) is woken and sends what changed. New
+notifications reach streams the same way through the outbox
+(app.notifications.outbox).
+
+Streams live in the worker that accepted the connection. On PostgreSQL
+`notify_user` also issues a NOTIFY inside the transaction, which every
+worker's listener receives on commit, so a notification created by one
+worker reaches streams and unread-count caches of the others. Other
+databases only reach the same process.
+"""
+import asyncio
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from app.core.metrics import register_metrics
+from app.db.database import async_engine
+from app.services.notification_counters import invalidate_unread_count
+
+PG_CHANNEL = "user_notifications"
+# Distinguishes this process's own NOTIFY messages, already delivered locally
+WORKER_ID = uuid.uuid4().hex[:12]
+LISTENER_KEEPALIVE_SECONDS = 30
+
+_PENDING_KEY = "notify_user_ids"
+
+
+class StreamSubscription:
+    """Wake-up event of one open stream and the notifications updated since it last sent"""
+
+    def __init__(self):
+        self.wake = asyncio.Event()
+        self.updated: Set[int] = set()
+
+    def deliver(self, updated_ids: Iterable[int]) -> None:
+        self.updated.update(updated_ids)
+        self.wake.set()
+
+    def take_updated(self) -> Set[int]:
+        updated, self.updated = self.updated, set()
+        return updated
+
+
+class NotificationBroker:
+    """Per-user subscriptions of the open streams of this process"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[StreamSubscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def subscribe(self, user_id: int) -> StreamSubscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = StreamSubscription()
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id: int, subscription: StreamSubscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id: int, updated_ids: Iterable[int] = ()) -> None:
+        """Wake the user's streams; safe to call from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers or self._loop is None:
+            return
+        self.published += 1
+        updated_ids = tuple(updated_ids)
+        for subscription in subscribers:
+            self._loop.call_soon_threadsafe(subscription.deliver, updated_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._subscribers),
+                "streams": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published,
+                "listener": "running" if _listener_task and not _listener_task.done() else "off",
+            }
+
+
+broker = NotificationBroker()
+register_metrics("notification_streams", broker.stats)
+
+
+def notify_user(db: Session, user_id: int, updated_ids: Iterable[int] = ()) -> None:
+    """
+    Wake the user's notification streams when this session commits.
+    `updated_ids` are existing notifications changed in place, which streams
+    send again as `notification_updated` events.
+    """
+    updated_ids = list(updated_ids)
+    db.info.setdefault(_PENDING_KEY, {}).setdefault(user_id, set()).update(updated_ids)
+    if db.get_bind().dialect.name == "postgresql":
+        payload = f"{WORKER_ID}:{user_id}"
+        if updated_ids:
+            payload += ":" + ",".join(str(notification_id) for notification_id in updated_ids)
+        db.execute(select(func.pg_notify(PG_CHANNEL, payload)))
+
+
+def wake_user(user_id: int, updated_ids: Iterable[int] = ()) -> None:
+    """Drop the user's cached unread count and wake their streams in this worker"""
+    invalidate_unread_count(user_id)
+    broker.publish(user_id, updated_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    for user_id, updated_ids in session.info.pop(_PENDING_KEY, {}).items():
+        wake_user(user_id, updated_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _on_pg_notify(connection, pid, channel, payload: str) -> None:
+    # "worker:user_id" or "worker:user_id:updated_id,updated_id"
+    worker_id, _, rest = payload.partition(":")
+    user_id, _, updated = rest.partition(":")
+    if worker_id != WORKER_ID and user_id.isdigit():
+        wake_user(int(user_id), [int(i) for i in updated.split(",") if i.isdigit()])
+
+
+async def _listen() -> None:
+    """Hold a LISTEN connection, reconnecting after failures"""
+    while True:
+        try:
+            async with async_engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.add_listener(PG_CHANNEL, _on_pg_notify)
+                while True:
+                    await asyncio.sleep(LISTENER_KEEPALIVE_SECONDS)
+                    await conn.execute(text("SELECT 1"))
+                    await conn.rollback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Notification listener disconnected: {e}")
+            await asyncio.sleep(5)
+
+
+_listener_task: Optional[asyncio.Task] = None
+
+
+def start_listener() -> None:
+    """Start the cross-worker listener on PostgreSQL (asyncpg)"""
+    global _listener_task
+    if async_engine.dialect.driver == "asyncpg" and _listener_task is None:
+        _listener_task = asyncio.get_running_loop().create_task(_listen())
+
+
+async def stop_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
@@ -1,43 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from typing import List, Optional
 from datetime import datetime
 from app.pfe.schemas import PFEListingResponse, PFECreate
-from app.models import PFEListing, Application, User, UserRole, Enterprise, Student, MatchPreview, NotificationType
-from app.core.dependencies import get_current_user
-from app.db.database import get_db
-from app.services.matching_service import calculate_match_score
-from app.notifications.router import create_notification
+from app.models import PFEListing, Application, ApplicationMatchDetails, UserRole, Student, MatchPreview, Notification, NotificationType
+from app.models.application import ApplicationStatus
+from app.core.dependencies import Principal, get_current_enterprise, get_current_student, get_current_user
+from app.core.idempotency import run_idempotent
+from app.db.database import get_db, get_async_db
+from app.db.replicas import get_read_db
+from app.db.types import json_array_contains
+from app.db.upsert import upsert_insert
+from app.services.matching_service import calculate_match_score, match_details_from_result
+from app.services.match_features import refresh_pfe_features, ensure_student_features, ensure_pfe_features
+from app.notifications.router import create_notifications
+from app.notifications.coalescing import new_application_notification
+from app.dashboard.stats import invalidate_enterprise_statistics
+from app.services.application_events import application_created
+from app.services.application_history import get_funnel
 
 router = APIRouter(prefix="/api/pfe", tags=["PFE Listings"])
 
 
 @router.get("/listings")
 def get_all_pfes(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
 ):
     """
     Get all PFE listings for the logged-in enterprise.
     Only enterprise users can access this endpoint.
     """
-    # Check if user is an enterprise
-    if current_user.role != UserRole.ENTERPRISE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only enterprise users can access this endpoint"
-        )
-
-    # Get enterprise profile
-    enterprise = db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
-    if not enterprise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enterprise profile not found"
-        )
-
-    # Get only listings belonging to this enterprise
-    pfes = db.query(PFEListing).filter(PFEListing.enterprise_id == enterprise.id).all()
+    # Get only listings belonging to this enterprise, selecting just the
+    # listed columns and counting applicants in the database
+    applicant_count = (
+        select(func.count(Application.id))
+        .where(Application.pfe_listing_id == PFEListing.id)
+        .scalar_subquery()
+    )
+    pfes = db.execute(
+        select(
+            PFEListing.id,
+            PFEListing.title,
+            PFEListing.category,
+            PFEListing.duration,
+            PFEListing.status,
+            PFEListing.skills,
+            applicant_count.label("applicant_count"),
+        ).where(PFEListing.enterprise_id == current_user.enterprise_id)
+    ).all()
     return [
         {
             "id": p.id,
@@ -46,7 +60,7 @@ def get_all_pfes(
             "duration": p.duration,
             "status": p.status.value if hasattr(p.status, "value") else p.status,
             "skills": p.skills if p.skills else [],
-            "applicantCount": len(p.applications) if p.applications else 0,
+            "applicantCount": p.applicant_count,
         }
         for p in pfes
     ]
@@ -55,35 +69,20 @@ def get_all_pfes(
 @router.get("/listings/{id}")
 def get_pfe_by_id(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
 ):
     """
     Get a specific PFE listing by ID.
     Only the enterprise that owns the listing can access it.
     """
-    # Check if user is an enterprise
-    if current_user.role != UserRole.ENTERPRISE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only enterprise users can access this endpoint"
-        )
-
-    # Get enterprise profile
-    enterprise = db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
-    if not enterprise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enterprise profile not found"
-        )
-
     # Get PFE listing
-    p = db.query(PFEListing).filter(PFEListing.id == id).first()
+    p = db.query(PFEListing).options(undefer(PFEListing.description)).filter(PFEListing.id == id).first()
     if not p:
         raise HTTPException(status_code=404, detail="PFE listing not found")
 
     # Verify ownership
-    if p.enterprise_id != enterprise.id:
+    if p.enterprise_id != current_user.enterprise_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to view this listing"
@@ -106,35 +105,20 @@ def get_pfe_by_id(
 @router.get("/listings/{id}/applicants")
 def get_applicants_for_pfe(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
 ):
     """
     Get applicants for a specific PFE listing.
     Only the enterprise that posted the listing can access this endpoint.
     """
-    # Check if user is an enterprise
-    if current_user.role != UserRole.ENTERPRISE:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only enterprise users can access this endpoint"
-        )
-
-    # Get enterprise profile
-    enterprise = db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
-    if not enterprise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enterprise profile not found"
-        )
-
     # Get PFE listing and verify ownership
     pfe = db.query(PFEListing).filter(PFEListing.id == id).first()
     if not pfe:
         raise HTTPException(status_code=404, detail="PFE listing not found")
 
     # Verify the listing belongs to this enterprise
-    if pfe.enterprise_id != enterprise.id:
+    if pfe.enterprise_id != current_user.enterprise_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to view applicants for this listing"
@@ -175,11 +159,34 @@ def get_applicants_for_pfe(
     return result
 
 
+@router.get("/listings/{id}/funnel")
+def get_funnel_for_pfe(
+    id: int,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_enterprise)
+):
+    """
+    Recruitment funnel (pending → reviewed → shortlisted → interview → accepted)
+    for a PFE listing. Only the enterprise that posted the listing can access it.
+    """
+    # Verify the listing belongs to this enterprise
+    pfe_enterprise_id = db.query(PFEListing.enterprise_id).filter(PFEListing.id == id).scalar()
+    if pfe_enterprise_id is None:
+        raise HTTPException(status_code=404, detail="PFE listing not found")
+    if pfe_enterprise_id != current_user.enterprise_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to view this listing's funnel"
+        )
+
+    return get_funnel(db, id)
+
+
 @router.post("/listings", status_code=status.HTTP_201_CREATED)
 def create_pfe_listing(
     pfe_data: PFECreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
     Create a new PFE listing.
@@ -193,10 +200,7 @@ def create_pfe_listing(
         )
 
     # Verify enterprise profile exists
-    enterprise = (
-        db.query(Enterprise).filter(Enterprise.user_id == current_user.id).first()
-    )
-    if not enterprise:
+    if current_user.enterprise_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Enterprise profile not found. Please complete your profile first.",
@@ -212,14 +216,17 @@ def create_pfe_listing(
         location=pfe_data.location,
         status=pfe_data.status,
         skills=pfe_data.skills if pfe_data.skills else [],
-        enterprise_id=enterprise.id,
+        enterprise_id=current_user.enterprise_id,
         deadline=pfe_data.deadline,
         posted_date=datetime.now(),
     )
 
     db.add(new_pfe)
+    db.flush()
+    refresh_pfe_features(db, new_pfe)
     db.commit()
     db.refresh(new_pfe)
+    invalidate_enterprise_statistics(current_user.enterprise_id)
 
     # Return the created PFE listing
     return {
@@ -243,12 +250,14 @@ def create_pfe_listing(
 
 @router.get("/explore", response_model=List[PFEListingResponse])
 def get_pfe_listings_for_students(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    skills: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Get all PFE listings for student explore page.
     Returns complete listing information including company details.
+    Optionally filtered to listings requiring every skill in `skills`.
     Only students can access this endpoint.
     """
     # Check if user is a student
@@ -258,13 +267,25 @@ def get_pfe_listings_for_students(
             detail="Only students can access this endpoint"
         )
 
-    # Query all PFE listings with their relationships
-    pfe_listings = db.query(PFEListing).all()
+    # Query all PFE listings with their enterprise and applicant count in
+    # one statement; the description is serialized, so load it up front
+    applicant_count = (
+        select(func.count(Application.id))
+        .where(Application.pfe_listing_id == PFEListing.id)
+        .scalar_subquery()
+    )
+    query = db.query(PFEListing, applicant_count.label("applicant_count")).options(
+        undefer(PFEListing.description),
+        joinedload(PFEListing.enterprise),
+    )
+    if skills:
+        query = query.filter(
+            json_array_contains(PFEListing.skills, skills, db.get_bind().dialect.name)
+        )
+    pfe_listings = query.all()
 
     result = []
-    for listing in pfe_listings:
-        # Get applicant count
-        applicant_count = len(listing.applications) if listing.applications else 0
+    for listing, applicant_count in pfe_listings:
 
         # Get skills as list of strings
         skills = listing.skills if listing.skills else []
@@ -322,17 +343,60 @@ def get_pfe_listings_for_students(
     return result
 
 
+async def _insert_application(db: AsyncSession, application: Application):
+    """
+    INSERT the application unless the student already applied to the listing.
+    Returns (id, created_at), or None when the pair already exists.
+    """
+    values = {
+        column.key: getattr(application, column.key)
+        for column in Application.__table__.columns
+        if getattr(application, column.key) is not None
+    }
+    dialect_insert = upsert_insert(db.bind.dialect.name)
+    if dialect_insert is not None:
+        result = await db.execute(
+            dialect_insert(Application.__table__)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["student_id", "pfe_listing_id"])
+            .returning(Application.id, Application.created_at)
+        )
+        return result.first()
+
+    try:
+        async with db.begin_nested():
+            result = await db.execute(
+                insert(Application.__table__).values(**values).returning(Application.id, Application.created_at)
+            )
+            return result.first()
+    except IntegrityError:
+        return None
+
+
 @router.post("/listings/{id}/apply", status_code=status.HTTP_201_CREATED)
 async def apply_to_pfe(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Apply to a PFE listing as a student.
     The match score is calculated using AI to understand semantic relationships
     between the student's skills and the PFE requirements.
+    Retries with the same Idempotency-Key header replay the first response.
     """
+    return await run_idempotent(
+        request,
+        idempotency_key,
+        current_user.id,
+        lambda: _apply_to_pfe(id, db, current_user),
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+async def _apply_to_pfe(id: int, db: AsyncSession, current_user: Principal):
     # Check if user is a student
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(
@@ -340,28 +404,33 @@ async def apply_to_pfe(
             detail="Only students can apply to PFE listings"
         )
 
-    # Get student profile
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
+    # Load the student, the listing with its enterprise and the student's
+    # application state in one round trip
+    already_applied = select(Application.id).where(
+        Application.student_id == Student.id,
+        Application.pfe_listing_id == id
+    ).exists()
+    has_applications = select(Application.id).where(Application.student_id == Student.id).exists()
+    row = (await db.execute(
+        select(Student, PFEListing, already_applied, has_applications)
+        .outerjoin(PFEListing, PFEListing.id == id)
+        .options(joinedload(PFEListing.enterprise), undefer(PFEListing.description))
+        .where(Student.user_id == current_user.id)
+    )).first()
+
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Student profile not found. Please complete your profile first."
         )
+    student, pfe, existing_application, has_applied_before = row
 
-    # Get PFE listing
-    pfe = db.query(PFEListing).filter(PFEListing.id == id).first()
     if not pfe:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="PFE listing not found"
         )
 
-    # Check if already applied
-    existing_application = db.query(Application).filter(
-        Application.student_id == student.id,
-        Application.pfe_listing_id == id
-    ).first()
-    
     if existing_application:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -369,9 +438,14 @@ async def apply_to_pfe(
         )
 
     # Check if this is the student's first application
-    is_first_application = db.query(Application).filter(
-        Application.student_id == student.id
-    ).count() == 0
+    is_first_application = not has_applied_before
+
+    # Make sure the stored match features are current, then end the read
+    # transaction so no connection (or feature row lock) is held during the
+    # LLM call; loaded objects stay usable (expire_on_commit=False)
+    await db.run_sync(ensure_student_features, student)
+    await db.run_sync(ensure_pfe_features, pfe)
+    await db.commit()
 
     # Calculate match score using AI
     match_result = await calculate_match_score(
@@ -380,48 +454,64 @@ async def apply_to_pfe(
         pfe_required_skills=pfe.skills or [],
         pfe_title=pfe.title,
         pfe_description=pfe.description,
-        student_desired_role=student.desired_job_role
+        student_desired_role=student.desired_job_role,
+        student_skill_ids=student.skill_ids,
+        pfe_skill_ids=pfe.skill_ids
     )
 
-    # Create application with calculated match score and LLM details
+    # Create application with calculated match score and LLM details.
+    # Everything below is committed in a single short transaction; the unique
+    # (student_id, pfe_listing_id) index settles concurrent duplicate applies.
     application = Application(
         student_id=student.id,
         pfe_listing_id=id,
-        match_rate=match_result["score"],
-        match_explanation=match_result.get("explanation", ""),
-        matched_skills=match_result.get("matched_skills", []),
-        missing_skills=match_result.get("missing_skills", []),
-        recommendations=match_result.get("recommendations", "")
+        status=ApplicationStatus.PENDING,
+        match_rate=match_result["score"]
     )
+    inserted = await _insert_application(db, application)
+    if not inserted:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You have already applied to this PFE listing"
+        )
+    application.id, application.created_at = inserted
+    db.add(ApplicationMatchDetails(
+        application_id=application.id,
+        payload=match_details_from_result(match_result)
+    ))
 
-    db.add(application)
-    db.commit()
-    db.refresh(application)
+    await db.run_sync(application_created, application, pfe.enterprise_id, current_user.id)
 
+    notifications = []
     # Create notification for the enterprise owner
+    # (merged into the listing's rolling notification or left to the digest,
+    # see app.notifications.coalescing)
     if pfe.enterprise and pfe.enterprise.user_id:
         student_name = f"{student.first_name} {student.last_name}"
-        create_notification(
-            db=db,
-            user_id=pfe.enterprise.user_id,
-            title="New Application Received",
-            message=f"{student_name} has applied to your PFE listing: {pfe.title}",
-            notification_type=NotificationType.NEW_APPLICATION,
-            pfe_listing_id=pfe.id,
-            application_id=application.id
+        notification = await db.run_sync(
+            new_application_notification,
+            pfe.enterprise.user_id,
+            pfe,
+            student_name,
+            application.id
         )
+        if notification is not None:
+            notifications.append(notification)
 
     # Send first application congratulation notification to the student
     if is_first_application:
-        create_notification(
-            db=db,
+        notifications.append(Notification(
             user_id=current_user.id,
             title="First Application Submitted! 🚀",
             message=f"Congratulations on your first PFE application! You applied to '{pfe.title}' with a {match_result['score']}% match score.",
-            notification_type=NotificationType.SYSTEM,
+            type=NotificationType.SYSTEM,
             pfe_listing_id=pfe.id,
             application_id=application.id
-        )
+        ))
+    await db.run_sync(create_notifications, notifications)
+
+    await db.commit()
+    invalidate_enterprise_statistics(pfe.enterprise_id)
 
     return {
         "id": application.id,
@@ -443,8 +533,8 @@ async def apply_to_pfe(
 @router.get("/listings/{id}/match-preview")
 async def preview_match_score(
     id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Preview the match score for a PFE listing without applying.
@@ -458,7 +548,7 @@ async def preview_match_score(
         )
 
     # Get student profile
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
+    student = await db.scalar(select(Student).where(Student.user_id == current_user.id))
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -466,7 +556,9 @@ async def preview_match_score(
         )
 
     # Get PFE listing
-    pfe = db.query(PFEListing).filter(PFEListing.id == id).first()
+    pfe = await db.scalar(
+        select(PFEListing).options(undefer(PFEListing.description)).where(PFEListing.id == id)
+    )
     if not pfe:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -474,23 +566,28 @@ async def preview_match_score(
         )
 
     # Check if already applied
-    existing_application = db.query(Application).filter(
-        Application.student_id == student.id,
-        Application.pfe_listing_id == id
-    ).first()
+    existing_application = await db.scalar(
+        select(Application)
+        .options(selectinload(Application.match_details))
+        .where(
+            Application.student_id == student.id,
+            Application.pfe_listing_id == id
+        )
+    )
 
     # If already applied, return the stored match data (already recalculated on CV upload)
     if existing_application:
+        details = existing_application.match_details.payload if existing_application.match_details else {}
         return {
             "pfe_listing_id": id,
             "pfe_title": pfe.title,
             "match_score": existing_application.match_rate or 0,
             "already_applied": True,
             "match_details": {
-                "explanation": existing_application.match_explanation or "",
-                "matched_skills": existing_application.matched_skills or [],
-                "missing_skills": existing_application.missing_skills or [],
-                "recommendations": existing_application.recommendations or ""
+                "explanation": details.get("explanation") or "",
+                "matched_skills": details.get("matched_skills") or [],
+                "missing_skills": details.get("missing_skills") or [],
+                "recommendations": details.get("recommendations") or ""
             },
             "student_profile": {
                 "skills": student.skills or [],
@@ -503,6 +600,12 @@ async def preview_match_score(
             }
         }
 
+    # Make sure the stored match features are current, then end the
+    # transaction so no connection is held during the LLM call
+    await db.run_sync(ensure_student_features, student)
+    await db.run_sync(ensure_pfe_features, pfe)
+    await db.commit()
+
     # Only calculate fresh match score if not yet applied
     match_result = await calculate_match_score(
         student_skills=student.skills or [],
@@ -510,7 +613,9 @@ async def preview_match_score(
         pfe_required_skills=pfe.skills or [],
         pfe_title=pfe.title,
         pfe_description=pfe.description,
-        student_desired_role=student.desired_job_role
+        student_desired_role=student.desired_job_role,
+        student_skill_ids=student.skill_ids,
+        pfe_skill_ids=pfe.skill_ids
     )
 
     return {
@@ -538,36 +643,36 @@ async def preview_match_score(
 
 @router.get("/applications/me")
 def get_my_applications(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_student)
 ):
     """
     Get all applications for the current student with full details.
     """
-    # Check if user is a student
-    if current_user.role != UserRole.STUDENT:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only students can view their applications"
-        )
-
-    # Get student profile
-    student = db.query(Student).filter(Student.user_id == current_user.id).first()
-    if not student:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Student profile not found"
-        )
-
     # Get all applications for this student
-    applications = db.query(Application).filter(
-        Application.student_id == student.id
+    applications = db.query(Application).options(
+        selectinload(Application.match_details),
+        joinedload(Application.pfe_listing).options(
+            undefer(PFEListing.description),
+            joinedload(PFEListing.enterprise),
+        ),
+    ).filter(
+        Application.student_id == current_user.student_id
     ).order_by(Application.created_at.desc()).all()
 
+    # Applicant counts of all listings in one query
+    pfe_ids = {app.pfe_listing_id for app in applications}
+    applicant_counts = dict(db.execute(
+        select(Application.pfe_listing_id, func.count(Application.id))
+        .where(Application.pfe_listing_id.in_(pfe_ids))
+        .group_by(Application.pfe_listing_id)
+    ).all()) if pfe_ids else {}
+
     result = []
     for app in applications:
         # Get PFE listing details
         pfe = app.pfe_listing
+        details = app.match_details.payload if app.match_details else {}
         
         # Prepare company info
         company_info = None
@@ -604,7 +709,7 @@ def get_my_applications(
                 "category": pfe.category,
                 "duration": pfe.duration,
                 "skills": pfe.skills or [],
-                "applicantCount": len(pfe.applications) if pfe.applications else 0,
+                "applicantCount": applicant_counts.get(pfe.id, 0),
                 "description": pfe.description,
                 "department": pfe.department,
                 "postedDate": pfe.posted_date,
@@ -619,10 +724,10 @@ def get_my_applications(
             "student_id": app.student_id,
             "status": app.status.value if hasattr(app.status, "value") else app.status,
             "match_score": app.match_rate or 0,
-            "match_explanation": app.match_explanation or "",
-            "matched_skills": app.matched_skills or [],
-            "missing_skills": app.missing_skills or [],
-            "recommendations": app.recommendations or "",
+            "match_explanation": details.get("explanation") or "",
+            "matched_skills": details.get("matched_skills") or [],
+            "missing_skills": details.get("missing_skills") or [],
+            "recommendations": details.get("recommendations") or "",
             "applied_at": app.created_at.isoformat() if app.created_at else None,
             "pfe_listing": pfe_data,
         })
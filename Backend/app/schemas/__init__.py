@@ -4,6 +4,7 @@ from .user import (
     EnterpriseRegisterDTO,
     LoginDTO,
     Token,
+    RefreshTokenDTO,
     TokenData,
     StudentProfileUpdate,
     EnterpriseProfileUpdate,
@@ -22,6 +23,7 @@ __all__ = [
     "EnterpriseRegisterDTO",
     "LoginDTO",
     "Token",
+    "RefreshTokenDTO",
     "TokenData",
     "StudentProfileUpdate",
     "EnterpriseProfileUpdate",
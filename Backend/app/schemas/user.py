@@ -67,11 +67,17 @@ class LoginDTO(BaseModel):
 class Token(BaseModel):
     """JWT Token response"""
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
     user_type: str
     profile_completed: bool
 
 
+class RefreshTokenDTO(BaseModel):
+    """Refresh token exchanged for a new token pair, or revoked on logout"""
+    refresh_token: str = Field(..., min_length=1)
+
+
 class TokenData(BaseModel):
     """Token payload data"""
     user_id: Optional[int] = None
@@ -0,0 +1,86 @@
+"""
+One-off removal of duplicate applications.
+
+Databases created before the unique (student_id, pfe_listing_id) index may
+hold several applications of a student to the same listing, and startup
+refuses to run until they are gone. This command keeps the oldest
+application of each pair and deletes the others. Rows referencing them are
+deleted or unlinked as their foreign keys say, also on SQLite where foreign
+keys are not enforced. It then creates the unique index and rebuilds the
+statistics derived from applications:
+
+    python -m app.services.application_dedupe
+"""
+from typing import List
+from sqlalchemy import delete, func, inspect, select, update
+from sqlalchemy.orm import Session
+from app.db.database import Base
+from app.models import Application
+from app.services.application_history import rebuild_funnel_counters
+from app.services.daily_stats import rebuild_daily_stats
+from app.services.stats_rollup import rebuild_stats_rollup
+
+UNIQUE_INDEX = "uq_applications_student_id_pfe_listing_id"
+_applications = Application.__table__
+
+
+def find_duplicate_applications(db: Session) -> List[int]:
+    """Ids of every application but the oldest of each (student, listing) pair"""
+    ranked = (
+        select(
+            Application.id,
+            func.row_number().over(
+                partition_by=(Application.student_id, Application.pfe_listing_id),
+                order_by=Application.id,
+            ).label("position"),
+        )
+        .where(Application.student_id.isnot(None), Application.pfe_listing_id.isnot(None))
+        .subquery()
+    )
+    return list(db.scalars(select(ranked.c.id).where(ranked.c.position > 1)))
+
+
+def _delete_applications(db: Session, ids: List[int]) -> None:
+    existing_tables = set(inspect(db.connection()).get_table_names())
+    for referencing in Base.metadata.sorted_tables:
+        if referencing.name not in existing_tables:
+            continue
+        for fk in referencing.foreign_keys:
+            if fk.column.table is not _applications:
+                continue
+            if fk.ondelete == "SET NULL":
+                db.execute(update(referencing).where(fk.parent.in_(ids)).values({fk.parent.name: None}))
+            else:
+                db.execute(delete(referencing).where(fk.parent.in_(ids)))
+    db.execute(delete(_applications).where(_applications.c.id.in_(ids)))
+
+
+def dedupe_applications(db: Session) -> int:
+    """
+    Delete duplicate applications, create the unique index and rebuild the
+    rollup, daily buckets and funnel counters. Returns the number deleted.
+    """
+    ids = find_duplicate_applications(db)
+    if ids:
+        _delete_applications(db, ids)
+
+    existing_indexes = {i["name"] for i in inspect(db.connection()).get_indexes(_applications.name)}
+    if UNIQUE_INDEX not in existing_indexes:
+        next(i for i in _applications.indexes if i.name == UNIQUE_INDEX).create(db.connection())
+    db.commit()
+
+    if ids:
+        rebuild_stats_rollup(db)
+        rebuild_daily_stats(db)
+        rebuild_funnel_counters(db)
+    return len(ids)
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Deleted {dedupe_applications(session)} duplicate applications")
+    finally:
+        session.close()
@@ -0,0 +1,47 @@
+"""
+Write-side hooks for application changes.
+
+Endpoints that create an application, change its status or rescore it call
+these before committing, so derived tables stay consistent with the
+applications table in the same transaction.
+"""
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.models import Application
+from app.models.application import ApplicationStatus
+from app.services import application_history, daily_stats, stats_rollup
+
+
+def application_created(db: Session, application: Application, enterprise_id: int, changed_by_user_id: Optional[int] = None) -> None:
+    """Call after the new application has been flushed"""
+    stats_rollup.record_application_created(db, application, enterprise_id)
+    daily_stats.record_application_created(db, application, enterprise_id)
+    application_history.record_application_created(db, application, changed_by_user_id)
+
+
+def application_status_changed(db: Session, application: Application, enterprise_id: int, old_status, new_status, changed_by_user_id: Optional[int] = None) -> None:
+    if ApplicationStatus(old_status) == ApplicationStatus(new_status):
+        return
+    stats_rollup.record_status_changed(db, application, enterprise_id, old_status, new_status)
+    daily_stats.record_status_changed(db, application, enterprise_id)
+    application_history.record_status_changed(db, application, old_status, new_status, changed_by_user_id)
+
+
+def applications_status_changed(db: Session, changes: List[application_history.StatusChange], enterprise_id: int, changed_by_user_id: Optional[int] = None) -> None:
+    """application_status_changed for many applications of one enterprise, with batched writes"""
+    changes = [
+        (application, old_status, new_status)
+        for application, old_status, new_status in changes
+        if ApplicationStatus(old_status) != ApplicationStatus(new_status)
+    ]
+    if not changes:
+        return
+    stats_rollup.record_status_changes(db, changes, enterprise_id)
+    daily_stats.record_status_changes(db, [application for application, _, _ in changes], enterprise_id)
+    application_history.record_status_changes(db, changes, changed_by_user_id)
+
+
+def application_rescored(db: Session, application: Application, enterprise_id: int, old_match_rate: Optional[int]) -> None:
+    """Call after application.match_rate has been updated"""
+    stats_rollup.record_match_rate_changed(db, application, enterprise_id, old_match_rate)
+    daily_stats.record_match_rate_changed(db, application, enterprise_id, old_match_rate)
@@ -0,0 +1,202 @@
+"""
+Application status history and recruitment funnel counters.
+
+Every status transition is appended to `application_status_history` in
+the same transaction as the change (see app.services.application_events),
+and `pfe_funnel_counters` is adjusted from the application's own history
+rows, so funnel reads never rescan applications. Rebuild the counters from
+the history with:
+
+    python -m app.services.application_history
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app.db.counters import increment
+from app.models import Application, ApplicationStatusHistory, PFEFunnelCounters
+from app.models.application import ApplicationStatus
+
+FUNNEL_STAGES = [
+    ApplicationStatus.PENDING,
+    ApplicationStatus.REVIEWED,
+    ApplicationStatus.SHORTLISTED,
+    ApplicationStatus.INTERVIEW,
+    ApplicationStatus.ACCEPTED,
+]
+DECISIONS = (ApplicationStatus.ACCEPTED, ApplicationStatus.REJECTED)
+
+_funnel = PFEFunnelCounters.__table__
+
+# (application, old status, new status); the application needs id,
+# pfe_listing_id and created_at
+StatusChange = Tuple[Application, object, object]
+
+
+def _as_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def _funnel_deltas(previous: List[ApplicationStatus], new_status: ApplicationStatus, decision_seconds: Optional[int]) -> Dict[str, int]:
+    """Counter changes for an application moving to `new_status` after `previous` statuses"""
+    deltas: Dict[str, int] = {}
+    furthest = max((FUNNEL_STAGES.index(s) for s in previous if s in FUNNEL_STAGES), default=-1)
+    if new_status in FUNNEL_STAGES:
+        for stage in FUNNEL_STAGES[furthest + 1:FUNNEL_STAGES.index(new_status) + 1]:
+            deltas[f"reached_{stage.value}"] = 1
+    if new_status == ApplicationStatus.REJECTED and ApplicationStatus.REJECTED not in previous:
+        deltas["rejected"] = 1
+    if new_status in DECISIONS and not any(s in DECISIONS for s in previous) and decision_seconds is not None:
+        deltas["decisions"] = 1
+        deltas["decision_seconds_sum"] = decision_seconds
+    return deltas
+
+
+def record_application_created(db: Session, application: Application, changed_by_user_id: Optional[int] = None) -> None:
+    status = ApplicationStatus(application.status or ApplicationStatus.PENDING)
+    db.add(ApplicationStatusHistory(
+        application_id=application.id,
+        pfe_listing_id=application.pfe_listing_id,
+        to_status=status,
+        changed_by_user_id=changed_by_user_id,
+    ))
+    increment(db, _funnel, {"pfe_listing_id": application.pfe_listing_id}, _funnel_deltas([], status, None))
+
+
+def record_status_changed(db: Session, application: Application, old_status, new_status, changed_by_user_id: Optional[int] = None) -> None:
+    record_status_changes(db, [(application, old_status, new_status)], changed_by_user_id)
+
+
+def record_status_changes(db: Session, changes: List[StatusChange], changed_by_user_id: Optional[int] = None) -> None:
+    """Log several status transitions with one history read and one insert"""
+    previous: Dict[int, List[ApplicationStatus]] = defaultdict(list)
+    for application_id, to_status in db.execute(
+        select(ApplicationStatusHistory.application_id, ApplicationStatusHistory.to_status)
+        .where(ApplicationStatusHistory.application_id.in_([a.id for a, _, _ in changes]))
+    ):
+        previous[application_id].append(to_status)
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    funnel_deltas: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for application, old_status, new_status in changes:
+        old_status, new_status = ApplicationStatus(old_status), ApplicationStatus(new_status)
+        decision_seconds = None
+        if application.created_at is not None:
+            decision_seconds = int((now - _as_utc(application.created_at)).total_seconds())
+        rows.append({
+            "application_id": application.id,
+            "pfe_listing_id": application.pfe_listing_id,
+            "from_status": old_status,
+            "to_status": new_status,
+            "changed_by_user_id": changed_by_user_id,
+        })
+        deltas = _funnel_deltas(previous[application.id] or [old_status], new_status, decision_seconds)
+        for column, delta in deltas.items():
+            funnel_deltas[application.pfe_listing_id][column] += delta
+        # A later change of the same application in this batch sees this one
+        previous[application.id].append(new_status)
+
+    db.execute(insert(ApplicationStatusHistory), rows)
+    for pfe_listing_id, deltas in funnel_deltas.items():
+        increment(db, _funnel, {"pfe_listing_id": pfe_listing_id}, dict(deltas))
+
+
+def get_funnel(db: Session, pfe_listing_id: int) -> dict:
+    counters = db.get(PFEFunnelCounters, pfe_listing_id)
+    stages = []
+    previous_count = None
+    for stage in FUNNEL_STAGES:
+        count = getattr(counters, f"reached_{stage.value}") if counters else 0
+        stages.append({
+            "status": stage.value,
+            "count": count,
+            "conversionRate": round(count / previous_count * 100, 2) if previous_count else None,
+        })
+        previous_count = count
+    decisions = counters.decisions if counters else 0
+    return {
+        "pfeId": pfe_listing_id,
+        "stages": stages,
+        "rejected": counters.rejected if counters else 0,
+        "decisions": decisions,
+        "avgHoursToDecision": round(counters.decision_seconds_sum / decisions / 3600, 2) if decisions else None,
+    }
+
+
+def rebuild_funnel_counters(db: Session) -> int:
+    """Recompute every funnel row from the status history. Returns the number of rows."""
+    rows = db.execute(
+        select(
+            ApplicationStatusHistory.pfe_listing_id,
+            ApplicationStatusHistory.application_id,
+            ApplicationStatusHistory.to_status,
+            ApplicationStatusHistory.changed_at,
+        ).order_by(ApplicationStatusHistory.application_id, ApplicationStatusHistory.id)
+    )
+    funnels = defaultdict(lambda: defaultdict(int))
+    histories = defaultdict(list)
+    for pfe_listing_id, application_id, to_status, changed_at in rows:
+        histories[(pfe_listing_id, application_id)].append((to_status, changed_at))
+
+    for (pfe_listing_id, _), history in histories.items():
+        created_at = _as_utc(history[0][1])
+        previous: List[ApplicationStatus] = []
+        for to_status, changed_at in history:
+            seconds = int((_as_utc(changed_at) - created_at).total_seconds())
+            for column, delta in _funnel_deltas(previous, to_status, seconds).items():
+                funnels[pfe_listing_id][column] += delta
+            previous.append(to_status)
+
+    db.execute(delete(_funnel))
+    if funnels:
+        db.execute(insert(_funnel), [
+            {"pfe_listing_id": pfe_listing_id, **counters}
+            for pfe_listing_id, counters in funnels.items()
+        ])
+    db.commit()
+    return len(funnels)
+
+
+def ensure_status_history(db: Session) -> None:
+    """
+    Seed the history of applications created before it existed: a creation
+    row at created_at and, if the status moved on, one transition to the
+    current status at updated_at. Then build the funnel counters.
+    """
+    if db.scalar(select(ApplicationStatusHistory.id).limit(1)) is not None:
+        return
+
+    rows = []
+    for application in db.query(Application).yield_per(1000):
+        rows.append({
+            "application_id": application.id,
+            "pfe_listing_id": application.pfe_listing_id,
+            "from_status": None,
+            "to_status": ApplicationStatus.PENDING,
+            "changed_at": application.created_at or datetime.now(timezone.utc),
+        })
+        if application.status != ApplicationStatus.PENDING:
+            rows.append({
+                "application_id": application.id,
+                "pfe_listing_id": application.pfe_listing_id,
+                "from_status": ApplicationStatus.PENDING,
+                "to_status": application.status,
+                "changed_at": application.updated_at or application.created_at or datetime.now(timezone.utc),
+            })
+    if rows:
+        db.execute(insert(ApplicationStatusHistory), rows)
+        rebuild_funnel_counters(db)
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_funnel_counters(session)} funnel rows")
+    finally:
+        session.close()
@@ -1,16 +1,18 @@
 from __future__ import annotations
 from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.models import User, Student, Enterprise, UserRole
 from app.schemas import StudentRegisterDTO, EnterpriseRegisterDTO
-from app.core.security import get_password_hash, verify_password
+from app.core.hashing import hash_password, verify_and_update_password
 
 
-def register_student(dto: StudentRegisterDTO, db: Session) -> User:
+async def register_student(dto: StudentRegisterDTO, db: AsyncSession) -> User:
     """Register a new student user"""
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == dto.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == dto.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -20,13 +22,13 @@ def register_student(dto: StudentRegisterDTO, db: Session) -> User:
     # Create user
     user = User(
         email=dto.email,
-        password_hash=get_password_hash(dto.password),
+        password_hash=await hash_password(dto.password),
         role=UserRole.STUDENT,
         is_active=True,
         profile_completed=False
     )
     db.add(user)
-    db.flush()  # Get user.id before committing
+    await db.flush()  # Get user.id before committing
     
     # Create student profile with basic info
     student = Student(
@@ -35,16 +37,16 @@ def register_student(dto: StudentRegisterDTO, db: Session) -> User:
         last_name=dto.last_name
     )
     db.add(student)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 
-def register_enterprise(dto: EnterpriseRegisterDTO, db: Session) -> User:
+async def register_enterprise(dto: EnterpriseRegisterDTO, db: AsyncSession) -> User:
     """Register a new enterprise user"""
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == dto.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == dto.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -54,13 +56,13 @@ def register_enterprise(dto: EnterpriseRegisterDTO, db: Session) -> User:
     # Create user
     user = User(
         email=dto.email,
-        password_hash=get_password_hash(dto.password),
+        password_hash=await hash_password(dto.password),
         role=UserRole.ENTERPRISE,
         is_active=True,
         profile_completed=False
     )
     db.add(user)
-    db.flush()  # Get user.id before committing
+    await db.flush()  # Get user.id before committing
     
     # Create enterprise profile with basic info
     enterprise = Enterprise(
@@ -69,21 +71,30 @@ def register_enterprise(dto: EnterpriseRegisterDTO, db: Session) -> User:
         industry=dto.industry
     )
     db.add(enterprise)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 Optional[User]
-def authenticate_user(email: str, password: str, db: Session) -> User | None:
-    """Authenticate user with email and password"""
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(email: str, password: str, db: AsyncSession) -> User | None:
+    """
+    Authenticate user with email and password.
+    Re-hashes the password when the stored hash uses outdated parameters.
+    """
+    user = await db.scalar(select(User).where(User.email == email))
     
     if not user:
         return None
     
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not valid:
         return None
+
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+        await db.refresh(user)
     
     return user
 
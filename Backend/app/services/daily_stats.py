@@ -0,0 +1,185 @@
+"""
+Daily application activity buckets for trend charts.
+
+`pfe_daily_stats` holds one row per enterprise, PFE listing and UTC day,
+adjusted in the same transaction as the application change (see
+app.services.application_events). Time-range queries read at most one row
+per listing and day instead of scanning applications.
+`rebuild_daily_stats` recomputes every bucket:
+
+    python -m app.services.daily_stats
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import case, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.orm import Session
+from app.db.counters import increment
+from app.models import Application, ApplicationStatusHistory, PFEListing, PFEDailyStats
+
+_daily = PFEDailyStats.__table__
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _day_of(timestamp: Optional[datetime]) -> date:
+    if timestamp is None:
+        return utc_today()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+
+def _increment(db: Session, enterprise_id: int, pfe_listing_id: int, day: date, deltas: Dict[str, int]) -> None:
+    if enterprise_id is None:
+        return
+    increment(
+        db, _daily,
+        {"enterprise_id": enterprise_id, "pfe_listing_id": pfe_listing_id, "day": day},
+        deltas,
+    )
+
+
+def record_application_created(db: Session, application: Application, enterprise_id: int) -> None:
+    # created_at is set by the database; the application is received today
+    _increment(db, enterprise_id, application.pfe_listing_id, utc_today(), {
+        "applications_received": 1,
+        "match_rate_sum": application.match_rate or 0,
+        # Unscored applications stay out of the average, as in the rollup
+        "match_rate_count": 1 if application.match_rate is not None else 0,
+    })
+
+
+def record_status_changed(db: Session, application: Application, enterprise_id: int) -> None:
+    record_status_changes(db, [application], enterprise_id)
+
+
+def record_status_changes(db: Session, applications, enterprise_id: int) -> None:
+    """Status changes of several applications of one enterprise, one upsert per listing"""
+    per_listing: Dict[int, int] = defaultdict(int)
+    for application in applications:
+        per_listing[application.pfe_listing_id] += 1
+    for pfe_listing_id, transitions in per_listing.items():
+        _increment(db, enterprise_id, pfe_listing_id, utc_today(), {"status_transitions": transitions})
+
+
+def record_match_rate_changed(db: Session, application: Application, enterprise_id: int, old_match_rate: Optional[int]) -> None:
+    # Rescoring moves the average of the day the application was received
+    _increment(db, enterprise_id, application.pfe_listing_id, _day_of(application.created_at), {
+        "match_rate_sum": (application.match_rate or 0) - (old_match_rate or 0),
+        "match_rate_count": (application.match_rate is not None) - (old_match_rate is not None),
+    })
+
+
+def _utc_day(db: Session, timestamp):
+    """SQL expression for the UTC day of a timestamp column"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", timestamp))
+    return func.date(timestamp)
+
+
+def rebuild_daily_stats(db: Session) -> int:
+    """
+    Recompute every bucket with one INSERT ... SELECT: received applications
+    and match rates from the applications table, status transitions from the
+    status history. Returns the number of rows.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Block concurrent increments until the rebuilt rows are committed
+        db.execute(text("LOCK TABLE pfe_daily_stats IN EXCLUSIVE MODE"))
+
+    received = (
+        select(
+            PFEListing.enterprise_id.label("enterprise_id"),
+            Application.pfe_listing_id.label("pfe_listing_id"),
+            _utc_day(db, Application.created_at).label("day"),
+            literal(1).label("applications_received"),
+            literal(0).label("status_transitions"),
+            func.coalesce(Application.match_rate, 0).label("match_rate_sum"),
+            # Unscored applications stay out of the average
+            case((Application.match_rate.isnot(None), 1), else_=0).label("match_rate_count"),
+        )
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .where(PFEListing.enterprise_id.isnot(None))
+    )
+    transitions = (
+        select(
+            PFEListing.enterprise_id,
+            ApplicationStatusHistory.pfe_listing_id,
+            _utc_day(db, ApplicationStatusHistory.changed_at),
+            literal(0),
+            literal(1),
+            literal(0),
+            literal(0),
+        )
+        .join(PFEListing, PFEListing.id == ApplicationStatusHistory.pfe_listing_id)
+        .where(PFEListing.enterprise_id.isnot(None), ApplicationStatusHistory.from_status.isnot(None))
+    )
+    events = union_all(received, transitions).subquery()
+    counters = ["applications_received", "status_transitions", "match_rate_sum", "match_rate_count"]
+
+    db.execute(delete(_daily))
+    result = db.execute(
+        insert(_daily).from_select(
+            ["enterprise_id", "pfe_listing_id", "day", *counters],
+            select(
+                events.c.enterprise_id,
+                events.c.pfe_listing_id,
+                events.c.day,
+                *[func.sum(events.c[counter]) for counter in counters],
+            ).group_by(events.c.enterprise_id, events.c.pfe_listing_id, events.c.day),
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def ensure_daily_stats(db: Session) -> None:
+    """Backfill the buckets on databases that have applications but no buckets yet"""
+    if db.scalar(select(_daily.c.day).limit(1)) is None and db.scalar(select(Application.id).limit(1)) is not None:
+        rebuild_daily_stats(db)
+
+
+def get_time_series(db: Session, enterprise_id: int, days: int, pfe_listing_id: Optional[int] = None) -> List[dict]:
+    """One point per day for the last `days` days (today included), oldest first"""
+    end = utc_today()
+    start = end - timedelta(days=days - 1)
+
+    query = (
+        select(
+            PFEDailyStats.day,
+            func.sum(PFEDailyStats.applications_received),
+            func.sum(PFEDailyStats.status_transitions),
+            func.sum(PFEDailyStats.match_rate_sum),
+            func.sum(PFEDailyStats.match_rate_count),
+        )
+        .where(PFEDailyStats.enterprise_id == enterprise_id, PFEDailyStats.day >= start)
+        .group_by(PFEDailyStats.day)
+    )
+    if pfe_listing_id is not None:
+        query = query.where(PFEDailyStats.pfe_listing_id == pfe_listing_id)
+    by_day = {row[0]: row[1:] for row in db.execute(query)}
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        received, transitions, match_rate_sum, match_rate_count = by_day.get(day, (0, 0, 0, 0))
+        series.append({
+            "date": day.isoformat(),
+            "applications_received": received or 0,
+            "status_transitions": transitions or 0,
+            "avg_match_rate": round(match_rate_sum / match_rate_count, 2) if match_rate_count else None,
+        })
+    return series
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_daily_stats(session)} daily statistics rows")
+    finally:
+        session.close()
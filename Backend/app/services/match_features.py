@@ -0,0 +1,99 @@
+"""
+Write-time match features for students and PFE listings.
+
+Whenever a profile or listing changes, its canonical skill ids (sorted
+array) and a description term vector are stored on the row together with
+FEATURES_VERSION. Scoring reads the skill ids directly instead of
+re-normalizing skill lists per request; the term vectors are kept for
+description similarity (cosine_similarity) and do not affect match scores. Bump FEATURES_VERSION whenever the feature
+extraction changes; stale rows are recomputed on next use.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.models import Student, PFEListing
+from app.services.skill_catalog import sync_student_skills, sync_pfe_skills
+
+FEATURES_VERSION = 2
+
+# Terms kept per vector
+MAX_TERMS = 50
+
+_TOKEN = re.compile(r"[a-z][a-z0-9+#]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "with", "you", "your", "our", "are", "will", "who",
+    "this", "that", "from", "have", "has", "not", "but", "can", "all", "any",
+    "les", "des", "une", "pour", "avec", "dans", "sur", "par", "est", "qui",
+}
+
+
+def term_vector(*texts: Optional[str]) -> Dict[str, float]:
+    """L2-normalized term frequencies of the given texts"""
+    counts = Counter(
+        token
+        for text in texts if text
+        for token in _TOKEN.findall(text.lower())
+        if token not in _STOPWORDS
+    )
+    top = counts.most_common(MAX_TERMS)
+    norm = math.sqrt(sum(count * count for _, count in top)) or 1.0
+    return {term: round(count / norm, 4) for term, count in top}
+
+
+def cosine_similarity(a: Optional[Dict[str, float]], b: Optional[Dict[str, float]]) -> float:
+    """Cosine similarity of two normalized term vectors"""
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def refresh_student_features(db: Session, student: Student) -> None:
+    """Recompute and store the student's match features"""
+    student.skill_ids = sync_student_skills(db, student)
+    student.term_vector = term_vector(student.desired_job_role, student.short_bio)
+    student.features_version = FEATURES_VERSION
+
+
+def refresh_pfe_features(db: Session, pfe: PFEListing) -> None:
+    """Recompute and store the listing's match features"""
+    pfe.skill_ids = sync_pfe_skills(db, pfe)
+    pfe.term_vector = term_vector(pfe.title, pfe.description)
+    pfe.features_version = FEATURES_VERSION
+
+
+def ensure_student_features(db: Session, student: Student) -> bool:
+    """Refresh the student's features if missing or stale. Returns True if refreshed."""
+    if student.features_version == FEATURES_VERSION:
+        return False
+    refresh_student_features(db, student)
+    return True
+
+
+def ensure_pfe_features(db: Session, pfe: PFEListing) -> bool:
+    """Refresh the listing's features if missing or stale. Returns True if refreshed."""
+    if pfe.features_version == FEATURES_VERSION:
+        return False
+    refresh_pfe_features(db, pfe)
+    return True
+
+
+def refresh_stale_features(db: Session) -> None:
+    """Recompute features for every row written by an older FEATURES_VERSION"""
+    stale_students = db.query(Student).filter(
+        or_(Student.features_version.is_(None), Student.features_version != FEATURES_VERSION)
+    ).all()
+    for student in stale_students:
+        refresh_student_features(db, student)
+
+    stale_listings = db.query(PFEListing).filter(
+        or_(PFEListing.features_version.is_(None), PFEListing.features_version != FEATURES_VERSION)
+    ).all()
+    for pfe in stale_listings:
+        refresh_pfe_features(db, pfe)
+
+    db.commit()
@@ -2,6 +2,8 @@ import json
 import httpx
 from typing import List, Optional
 from app.core.config import settings
+from app.services import skill_catalog
+from app.services.match_features import ensure_student_features, ensure_pfe_features
 
 
 async def calculate_match_score(
@@ -10,7 +12,9 @@ async def calculate_match_score(
     pfe_required_skills: List[str],
     pfe_title: str,
     pfe_description: Optional[str] = None,
-    student_desired_role: Optional[str] = None
+    student_desired_role: Optional[str] = None,
+    student_skill_ids: Optional[List[int]] = None,
+    pfe_skill_ids: Optional[List[int]] = None
 ) -> dict:
     """
     Use OpenAI GPT to calculate a semantic match score between a student's profile
@@ -19,12 +23,25 @@ async def calculate_match_score(
     The LLM understands relationships between technologies (e.g., Next.js relates to React/JavaScript)
     and can provide a more intelligent matching than simple keyword matching.
     
+    When precomputed canonical skill ids (see app.services.match_features)
+    are given, the fallback matcher uses them directly instead of
+    normalizing the free-text lists.
+
     Returns:
         dict with 'score' (0-100), 'explanation', and 'matched_skills'
     """
+    def fallback() -> dict:
+        return _basic_match(
+            student_skills,
+            student_technologies,
+            pfe_required_skills,
+            student_skill_ids=student_skill_ids,
+            pfe_skill_ids=pfe_skill_ids
+        )
+
     if not settings.OPENAI_API_KEY:
         # Fallback to basic matching if no API key
-        return _basic_match(student_skills, student_technologies, pfe_required_skills)
+        return fallback()
     
     # Combine student skills and technologies
     student_all_skills = list(set(student_skills + student_technologies))
@@ -140,24 +157,27 @@ Return ONLY valid JSON:
                 }
             else:
                 print(f"OpenAI API error: {response.status_code} - {response.text}")
-                return _basic_match(student_skills, student_technologies, pfe_required_skills)
+                return fallback()
                 
     except json.JSONDecodeError as e:
         print(f"Failed to parse LLM response as JSON: {e}")
-        return _basic_match(student_skills, student_technologies, pfe_required_skills)
+        return fallback()
     except Exception as e:
         print(f"Match score calculation error: {e}")
-        return _basic_match(student_skills, student_technologies, pfe_required_skills)
+        return fallback()
 
 
 def _basic_match(
     student_skills: List[str],
     student_technologies: List[str],
-    pfe_required_skills: List[str]
+    pfe_required_skills: List[str],
+    student_skill_ids: Optional[List[int]] = None,
+    pfe_skill_ids: Optional[List[int]] = None
 ) -> dict:
     """
     Fallback basic matching algorithm when LLM is not available.
-    Uses simple set intersection with case-insensitive comparison.
+    Intersects canonical skill ids when available, so aliases such as
+    "React" and "ReactJS" match; otherwise uses case-insensitive comparison.
     """
     if not pfe_required_skills:
         return {
@@ -168,13 +188,21 @@ def _basic_match(
             "recommendations": "Apply and highlight your relevant experience"
         }
     
-    # Normalize all skills to lowercase for comparison
-    student_all = set(s.lower().strip() for s in (student_skills + student_technologies))
-    required = set(s.lower().strip() for s in pfe_required_skills)
-    
-    # Find direct matches
-    matched = student_all.intersection(required)
-    missing = required - student_all
+    if student_skill_ids is not None and pfe_skill_ids is not None:
+        # Compare canonical ids, report canonical names
+        student_ids = set(student_skill_ids)
+        required_ids = set(pfe_skill_ids)
+        required = [skill_catalog.skill_name(i) or str(i) for i in required_ids]
+        matched = [skill_catalog.skill_name(i) or str(i) for i in required_ids & student_ids]
+        missing = [skill_catalog.skill_name(i) or str(i) for i in required_ids - student_ids]
+    else:
+        # Normalize all skills to lowercase for comparison
+        student_all = set(s.lower().strip() for s in (student_skills + student_technologies))
+        required = set(s.lower().strip() for s in pfe_required_skills)
+
+        # Find direct matches
+        matched = student_all.intersection(required)
+        missing = required - student_all
     
     # Calculate score based on percentage of required skills matched
     if len(required) > 0:
@@ -192,6 +220,16 @@ def _basic_match(
     }
 
 
+def match_details_from_result(match_result: dict) -> dict:
+    """Explanation part of a calculate_match_score result, as stored in match details"""
+    return {
+        "explanation": match_result.get("explanation", ""),
+        "matched_skills": match_result.get("matched_skills", []),
+        "missing_skills": match_result.get("missing_skills", []),
+        "recommendations": match_result.get("recommendations", ""),
+    }
+
+
 async def get_match_score_for_application(
     db_session,
     student_id: int,
@@ -213,6 +251,12 @@ async def get_match_score_for_application(
     if not pfe:
         return 0
     
+    # Make sure the stored match features are current
+    refreshed = ensure_student_features(db_session, student)
+    refreshed = ensure_pfe_features(db_session, pfe) or refreshed
+    if refreshed:
+        db_session.commit()
+
     # Calculate match
     result = await calculate_match_score(
         student_skills=student.skills or [],
@@ -220,7 +264,9 @@ async def get_match_score_for_application(
         pfe_required_skills=pfe.skills or [],
         pfe_title=pfe.title,
         pfe_description=pfe.description,
-        student_desired_role=student.desired_job_role
+        student_desired_role=student.desired_job_role,
+        student_skill_ids=student.skill_ids,
+        pfe_skill_ids=pfe.skill_ids
     )
     
     return result.get("score", 0)
@@ -0,0 +1,217 @@
+"""
+Per-user unread notification counters.
+
+Rows in `notification_counters` are adjusted in the same transaction as
+the notification change (create_notification, mark_as_read,
+mark_all_as_read), so GET /api/notifications/unread-count is a primary-key
+lookup instead of a COUNT over the user's notifications. Every change also
+bumps the row's `feed_version`, which versions the feed's ETag so an
+unchanged feed is answered without querying it. Counts (not versions) are
+cached per worker for UNREAD_COUNT_CACHE_TTL_SECONDS and invalidated when a change
+commits (see app.notifications.stream).
+
+`reconcile_unread_counters` recomputes the counters from the notifications
+table and repairs any drift, in batches of users whose counter rows are
+locked only for their batch. Workers run it every
+NOTIFICATION_COUNTER_RECONCILE_SECONDS, one at a time; it can also be run by
+hand:
+
+    python -m app.services.notification_counters
+"""
+import asyncio
+from typing import Iterable, Optional
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.db.counters import increment
+from app.db.database import SessionLocal
+from app.db.upsert import upsert_insert
+from app.models import Notification, NotificationCounter, User
+
+_counters = NotificationCounter.__table__
+
+# Serializes reconciliation runs of several workers (PostgreSQL advisory lock key)
+RECONCILE_LOCK_KEY = 4_810_772
+
+_cache = TTLCache(ttl=settings.UNREAD_COUNT_CACHE_TTL_SECONDS)
+register_metrics("unread_count_cache", _cache.stats)
+
+
+def record_unread_delta(db: Session, user_id: int, delta: int) -> None:
+    """Adjust the user's unread count and bump their feed version in the caller's transaction"""
+    increment(db, _counters, {"user_id": user_id}, {"unread_count": delta, "feed_version": 1})
+
+
+def record_feed_change(db: Session, user_id: int) -> None:
+    """Bump the user's feed version for a change that leaves the unread count as is"""
+    increment(db, _counters, {"user_id": user_id}, {"feed_version": 1})
+
+
+def record_feed_changes(db: Session, user_ids: Iterable[int]) -> None:
+    """Bump the feed version of several users in one statement"""
+    user_ids = list(user_ids)
+    dialect_insert = upsert_insert(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        for user_id in user_ids:
+            record_feed_change(db, user_id)
+        return
+    stmt = dialect_insert(_counters)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"feed_version": _counters.c.feed_version + 1},
+    )
+    db.execute(stmt, [{"user_id": user_id, "feed_version": 1} for user_id in user_ids])
+
+
+def get_unread_count(db: Session, user_id: int) -> int:
+    """Cached unread notification count for one user"""
+    count = _cache.get(user_id)
+    if count is None:
+        count = db.scalar(
+            select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+        ) or 0
+        _cache.set(user_id, count)
+    return count
+
+
+def get_feed_version(db: Session, user_id: int) -> int:
+    """
+    Version of the user's notification feed, read uncached through `db` so it
+    comes from the same database (primary or replica) as the feed itself
+    """
+    return db.scalar(
+        select(NotificationCounter.feed_version).where(NotificationCounter.user_id == user_id)
+    ) or 0
+
+
+def invalidate_unread_count(user_id: int) -> None:
+    _cache.invalidate(user_id)
+
+
+def _reconcile_batch(db: Session, user_ids) -> int:
+    """Repair the counters of some users, holding only their counter rows locked"""
+    # Give users with unread notifications but no counter a row to lock
+    unread_users = list(db.scalars(
+        select(Notification.user_id)
+        .where(Notification.user_id.in_(user_ids), Notification.is_read == False)
+        .distinct()
+    ))
+    if unread_users:
+        dialect_insert = upsert_insert(db.get_bind().dialect.name)
+        if dialect_insert is not None:
+            db.execute(
+                dialect_insert(_counters).on_conflict_do_nothing(index_elements=["user_id"]),
+                [{"user_id": user_id, "unread_count": 0} for user_id in unread_users],
+            )
+        else:
+            existing = set(db.scalars(select(_counters.c.user_id).where(_counters.c.user_id.in_(unread_users))))
+            missing = [{"user_id": user_id, "unread_count": 0} for user_id in unread_users if user_id not in existing]
+            if missing:
+                db.execute(insert(_counters), missing)
+
+    # Concurrent increments of these rows wait for our commit, and the count
+    # below sees every notification whose increment committed before the lock
+    stored = dict(db.execute(
+        select(NotificationCounter.user_id, NotificationCounter.unread_count)
+        .where(NotificationCounter.user_id.in_(user_ids))
+        .with_for_update()
+    ).all())
+    actual = dict(db.execute(
+        select(Notification.user_id, func.count(Notification.id))
+        .where(Notification.user_id.in_(list(stored)), Notification.is_read == False)
+        .group_by(Notification.user_id)
+    ).all())
+
+    # Rows are zeroed rather than deleted so feed versions never go back
+    drifted = [user_id for user_id, count in stored.items() if count != actual.get(user_id, 0)]
+    for user_id in drifted:
+        db.execute(
+            update(_counters)
+            .where(_counters.c.user_id == user_id)
+            .values(unread_count=actual.get(user_id, 0), feed_version=_counters.c.feed_version + 1)
+        )
+    db.commit()
+
+    for user_id in drifted:
+        invalidate_unread_count(user_id)
+    return len(drifted)
+
+
+def reconcile_unread_counters(db: Session) -> int:
+    """
+    Repair counters that differ from the notifications table, one batch of
+    users per transaction. Returns the number fixed. On PostgreSQL only one
+    worker reconciles at a time; the others return 0.
+    """
+    is_postgresql = db.get_bind().dialect.name == "postgresql"
+    fixed = 0
+    after = 0
+    while True:
+        # Held by the batch's transaction; the worker that loses it between
+        # two batches leaves the rest of the run to the one that took it
+        if is_postgresql and not db.scalar(select(func.pg_try_advisory_xact_lock(RECONCILE_LOCK_KEY))):
+            db.rollback()
+            return fixed
+        user_ids = list(db.scalars(
+            select(User.id)
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(settings.NOTIFICATION_COUNTER_RECONCILE_BATCH_SIZE)
+        ))
+        if not user_ids:
+            db.commit()
+            return fixed
+        fixed += _reconcile_batch(db, user_ids)
+        after = user_ids[-1]
+
+
+def ensure_notification_counters(db: Session) -> None:
+    """Build the counters on databases that have notifications but no counter rows yet"""
+    if db.scalar(select(_counters.c.user_id).limit(1)) is None and db.scalar(select(Notification.id).limit(1)) is not None:
+        reconcile_unread_counters(db)
+
+
+def _reconcile() -> int:
+    db = SessionLocal()
+    try:
+        return reconcile_unread_counters(db)
+    finally:
+        db.close()
+
+
+async def _reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS)
+        try:
+            fixed = await run_in_threadpool(_reconcile)
+            if fixed:
+                print(f"Reconciled {fixed} unread notification counters")
+        except Exception as e:
+            print(f"Unread counter reconciliation failed: {e}")
+
+
+_reconcile_task: Optional[asyncio.Task] = None
+
+
+def start_reconciliation() -> None:
+    global _reconcile_task
+    if settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS > 0 and _reconcile_task is None:
+        _reconcile_task = asyncio.get_running_loop().create_task(_reconcile_periodically())
+
+
+async def stop_reconciliation() -> None:
+    global _reconcile_task
+    if _reconcile_task is not None:
+        _reconcile_task.cancel()
+        try:
+            await _reconcile_task
+        except asyncio.CancelledError:
+            pass
+        _reconcile_task = None
+
+
+if __name__ == "__main__":
+    print(f"Reconciled {_reconcile()} unread notification counters")
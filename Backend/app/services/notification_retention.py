@@ -0,0 +1,225 @@
+"""
+Notification retention.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are moved to
+`notifications_archive` (payload zlib-compressed) in batches of
+NOTIFICATION_RETENTION_BATCH_SIZE, each its own short transaction, so the
+hot table only holds recent and unread notifications. Batches claim rows
+with SKIP LOCKED on PostgreSQL and never wait on rows a request is updating.
+
+On PostgreSQL the archive is partitioned by month of archiving; partitions
+older than NOTIFICATION_ARCHIVE_RETENTION_DAYS are dropped whole instead
+of deleted row by row. Other databases delete expired archive rows in
+batches.
+
+Workers run retention every NOTIFICATION_RETENTION_INTERVAL_SECONDS; it can
+also be run by hand:
+
+    python -m app.services.notification_retention
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models import Notification, NotificationArchive
+from app.services.notification_counters import invalidate_unread_count, record_feed_changes
+
+ARCHIVE_TABLE = NotificationArchive.__tablename__
+_PARTITION_NAME = re.compile(rf"^{ARCHIVE_TABLE}_(\d{{4}})_(\d{{2}})$")
+# Partition DDL gives up rather than queue behind long transactions
+DDL_LOCK_TIMEOUT = "5s"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month_start: datetime) -> datetime:
+    return _month_start(month_start + timedelta(days=32))
+
+
+def _is_postgresql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_archive_partitions(db: Session) -> None:
+    """Create the archive partitions of this month and the next (PostgreSQL)"""
+    db.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+    month = _month_start(_utcnow())
+    for _ in range(2):
+        end = _next_month(month)
+        db.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{ARCHIVE_TABLE}_{month:%Y_%m}" '
+            f'PARTITION OF "{ARCHIVE_TABLE}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        month = end
+    db.commit()
+
+
+def archive_batch(db: Session, cutoff: datetime) -> int:
+    """Move one batch of read notifications created before `cutoff` to the archive"""
+    rows = db.execute(
+        select(
+            Notification.id,
+            Notification.user_id,
+            Notification.created_at,
+            Notification.title,
+            Notification.message,
+            Notification.type,
+            Notification.pfe_listing_id,
+            Notification.application_id,
+            Notification.coalesced_count,
+        )
+        .where(Notification.is_read == True, Notification.created_at < cutoff)
+        .order_by(Notification.created_at)
+        .limit(settings.NOTIFICATION_RETENTION_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        return 0
+
+    archived_at = _utcnow()
+    db.execute(insert(NotificationArchive), [
+        {
+            "id": row.id,
+            "archived_at": archived_at,
+            "user_id": row.user_id,
+            "created_at": row.created_at,
+            "payload": {
+                "title": row.title,
+                "message": row.message,
+                "type": row.type.value if hasattr(row.type, "value") else row.type,
+                "pfe_listing_id": row.pfe_listing_id,
+                "application_id": row.application_id,
+                "coalesced_count": row.coalesced_count,
+            },
+        }
+        for row in rows
+    ])
+    db.execute(delete(Notification).where(Notification.id.in_([row.id for row in rows])))
+    # Read notifications leave unread counts as they are, but cached feeds change
+    user_ids = {row.user_id for row in rows}
+    record_feed_changes(db, user_ids)
+    db.commit()
+
+    for user_id in user_ids:
+        invalidate_unread_count(user_id)
+    return len(rows)
+
+
+def archive_notifications(db: Session) -> int:
+    """Archive every read notification past the retention age. Returns the number archived."""
+    if settings.NOTIFICATION_RETENTION_DAYS <= 0:
+        return 0
+    if _is_postgresql(db):
+        ensure_archive_partitions(db)
+
+    cutoff = _utcnow() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    archived = 0
+    while True:
+        moved = archive_batch(db, cutoff)
+        archived += moved
+        if moved < settings.NOTIFICATION_RETENTION_BATCH_SIZE:
+            return archived
+
+
+def drop_expired_archives(db: Session) -> int:
+    """
+    Drop archived notifications past NOTIFICATION_ARCHIVE_RETENTION_DAYS.
+    Returns the number of partitions (PostgreSQL) or rows dropped.
+    """
+    if settings.NOTIFICATION_ARCHIVE_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = _utcnow() - timedelta(days=settings.NOTIFICATION_ARCHIVE_RETENTION_DAYS)
+
+    if not _is_postgresql(db):
+        dropped = 0
+        while True:
+            ids = select(NotificationArchive.id).where(
+                NotificationArchive.archived_at < cutoff
+            ).limit(settings.NOTIFICATION_RETENTION_BATCH_SIZE)
+            deleted = db.execute(
+                delete(NotificationArchive).where(NotificationArchive.id.in_(ids))
+            ).rowcount
+            db.commit()
+            dropped += deleted
+            if deleted < settings.NOTIFICATION_RETENTION_BATCH_SIZE:
+                return dropped
+
+    partitions = db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": ARCHIVE_TABLE}).all()
+    dropped = 0
+    for name in partitions:
+        match = _PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+        if _next_month(month) <= cutoff:
+            db.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+            db.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            db.commit()
+            dropped += 1
+    return dropped
+
+
+def run_retention(db: Session) -> Tuple[int, int]:
+    """Archive old read notifications and drop expired archives"""
+    return archive_notifications(db), drop_expired_archives(db)
+
+
+def _run() -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        return run_retention(db)
+    finally:
+        db.close()
+
+
+async def _run_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.NOTIFICATION_RETENTION_INTERVAL_SECONDS)
+        try:
+            archived, dropped = await run_in_threadpool(_run)
+            if archived or dropped:
+                print(f"Archived {archived} notifications, dropped {dropped} expired archives")
+        except Exception as e:
+            print(f"Notification retention failed: {e}")
+
+
+_retention_task: Optional[asyncio.Task] = None
+
+
+def start_retention() -> None:
+    global _retention_task
+    if settings.NOTIFICATION_RETENTION_INTERVAL_SECONDS > 0 and _retention_task is None:
+        _retention_task = asyncio.get_running_loop().create_task(_run_periodically())
+
+
+async def stop_retention() -> None:
+    global _retention_task
+    if _retention_task is not None:
+        _retention_task.cancel()
+        try:
+            await _retention_task
+        except asyncio.CancelledError:
+            pass
+        _retention_task = None
+
+
+if __name__ == "__main__":
+    archived, dropped = _run()
+    print(f"Archived {archived} notifications, dropped {dropped} expired archives")
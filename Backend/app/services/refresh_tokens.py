@@ -0,0 +1,128 @@
+"""
+Rotating refresh tokens.
+
+Login and registration issue a refresh token valid for
+REFRESH_TOKEN_EXPIRE_DAYS next to the short-lived access token. Tokens are
+random strings; the database keeps only their HMAC-SHA256 under SECRET_KEY,
+so a lookup costs one hash and one indexed query instead of a bcrypt check.
+
+Each refresh marks the presented token used and issues its successor in
+the same family. A token presented again after use means it was copied:
+the whole family is revoked and the user must log in with their password.
+"""
+import hashlib
+import hmac
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models import RefreshToken, User
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def hash_refresh_token(token: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def issue_refresh_token(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """Add a new refresh token for the user to the session; the caller commits"""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or str(uuid.uuid4()),
+        expires_at=_utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def _revoke_family(db: AsyncSession, family_id: str) -> None:
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[User, str]:
+    """
+    Exchange a refresh token for its successor.
+    Raises 401 for unknown, expired or revoked tokens, and revokes the
+    family when a token is reused.
+    """
+    now = _utcnow()
+    record = await db.scalar(
+        select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    if record is None or record.revoked_at is not None:
+        raise _invalid_refresh_token()
+
+    # Mark the token used only if it is still live; losing this race to a
+    # concurrent refresh counts as reuse
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.id == record.id,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now,
+        )
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        used_at = await db.scalar(select(RefreshToken.used_at).where(RefreshToken.id == record.id))
+        if used_at is not None:
+            await _revoke_family(db, record.family_id)
+            await db.commit()
+        raise _invalid_refresh_token()
+
+    user = await db.scalar(select(User).where(User.id == record.user_id))
+    if user is None or not user.is_active:
+        await _revoke_family(db, record.family_id)
+        await db.commit()
+        raise _invalid_refresh_token()
+
+    new_token = await issue_refresh_token(db, user.id, record.family_id)
+    await db.commit()
+    return user, new_token
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str) -> None:
+    """Revoke the family of a refresh token (logout); unknown tokens are ignored"""
+    family_id = await db.scalar(
+        select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    if family_id is not None:
+        await _revoke_family(db, family_id)
+        await db.commit()
+
+
+async def purge_expired_refresh_tokens() -> None:
+    """Drop tokens past their expiry, and revoked tokens older than the expiry window"""
+    now = _utcnow()
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(RefreshToken).where(or_(
+                RefreshToken.expires_at < now,
+                RefreshToken.revoked_at < now - timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+            ))
+        )
+        await db.commit()
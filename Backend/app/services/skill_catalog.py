@@ -0,0 +1,196 @@
+"""
+Skill catalogue: canonical skills, alias resolution and the
+student_skills / pfe_skills association tables.
+
+Free-text skills ("React", "react.js", "ReactJS") are resolved to a single
+canonical skill id. The alias -> id lookup is loaded once at startup and
+kept in process; unknown skills are added to the catalogue on write.
+
+`sync_student_skills` and `sync_pfe_skills` rewrite the association rows
+and return the sorted canonical ids, which app.services.match_features
+stores as match features; `resolve_skill_ids` resolves names without
+writing rows and `skill_name` maps ids back to canonical names.
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Skill, SkillAlias, Student, PFEListing, student_skills, pfe_skills
+
+# Canonical name -> known spellings. Spellings are normalized before storage.
+SEED_ALIASES: Dict[str, List[str]] = {
+    "JavaScript": ["js", "ecmascript", "es6"],
+    "TypeScript": ["ts"],
+    "Python": ["python3", "py"],
+    "React": ["react.js", "reactjs"],
+    "Angular": ["angularjs", "angular.js"],
+    "Vue": ["vue.js", "vuejs"],
+    "Next.js": ["nextjs"],
+    "Node.js": ["node", "nodejs"],
+    "Express": ["express.js", "expressjs"],
+    "PostgreSQL": ["postgres", "psql"],
+    "MongoDB": ["mongo"],
+    "Kubernetes": ["k8s"],
+    "Go": ["golang"],
+    "C#": ["csharp", "c sharp"],
+    "C++": ["cpp"],
+    "AWS": ["amazon web services"],
+    "GCP": ["google cloud", "google cloud platform"],
+    "Azure": ["microsoft azure"],
+    "Machine Learning": ["ml"],
+    "Deep Learning": ["dl"],
+    "Artificial Intelligence": ["ai"],
+    "Natural Language Processing": ["nlp"],
+    "CI/CD": ["cicd", "ci cd"],
+    "Spring Boot": ["springboot"],
+    "scikit-learn": ["sklearn", "scikit learn"],
+}
+
+# Aliases seeded by earlier versions that matched unrelated skills ("cv" is
+# usually a résumé, "spring" and "next" are more than Spring Boot and
+# Next.js); removed from existing catalogues at startup
+RETIRED_ALIASES = ["cv", "spring", "next"]
+
+_SEPARATORS = re.compile(r"[\s._\-]+")
+# Stems that are ordinary words on their own keep their "js" suffix
+_AMBIGUOUS_JS_STEMS = {"next"}
+
+_lock = threading.Lock()
+_key_to_id: Dict[str, int] = {}
+_id_to_name: Dict[int, str] = {}
+
+
+def normalize_skill(name: str) -> str:
+    """
+    Build the lookup key for a skill name: lowercase, separators removed and
+    a trailing "js" suffix dropped ("React.js" -> "react", but "Next.js" ->
+    "nextjs"). Symbols such as "+" and "#" are kept so "C++" and "C#" stay
+    distinct from "C".
+    """
+    key = _SEPARATORS.sub("", name.strip().lower())
+    if key.endswith("js") and len(key) > 2 and key[:-2] not in _AMBIGUOUS_JS_STEMS:
+        key = key[:-2]
+    return key[:100]
+
+
+def _remember(key: str, skill_id: int, name: Optional[str] = None) -> None:
+    with _lock:
+        _key_to_id[key] = skill_id
+        if name is not None:
+            _id_to_name[skill_id] = name
+
+
+def skill_name(skill_id: int) -> Optional[str]:
+    """Canonical display name of a skill id"""
+    return _id_to_name.get(skill_id)
+
+
+def load_skill_catalog(db: Session) -> None:
+    """
+    Seed the catalogue and load the alias lookup into memory.
+    Called once at application startup.
+    """
+    _rekey_skills(db)
+    db.execute(
+        delete(SkillAlias).where(
+            SkillAlias.alias.in_(RETIRED_ALIASES),
+            # Keep skills genuinely named "CV", "Spring" or "Next"
+            SkillAlias.skill_id.notin_(select(Skill.id).where(Skill.key.in_(RETIRED_ALIASES))),
+        )
+    )
+    for name, aliases in SEED_ALIASES.items():
+        skill_id = _get_or_create_skill(db, name)
+        for key in {normalize_skill(alias) for alias in aliases} - {normalize_skill(name)}:
+            if not db.get(SkillAlias, key):
+                db.add(SkillAlias(alias=key, skill_id=skill_id))
+        db.flush()
+    db.commit()
+
+    with _lock:
+        _key_to_id.clear()
+        _id_to_name.clear()
+        for skill_id, name, key in db.execute(select(Skill.id, Skill.name, Skill.key)):
+            _id_to_name[skill_id] = name
+            _key_to_id[key] = skill_id
+        for alias, skill_id in db.execute(select(SkillAlias.alias, SkillAlias.skill_id)):
+            _key_to_id[alias] = skill_id
+
+
+def _rekey_skills(db: Session) -> None:
+    """Move skills whose key was built by an older normalize_skill to their current key"""
+    for skill_id, name, key in db.execute(select(Skill.id, Skill.name, Skill.key)).all():
+        new_key = normalize_skill(name)
+        if new_key == key:
+            continue
+        db.execute(update(Skill).where(Skill.id == skill_id).values(key=new_key))
+        db.execute(delete(SkillAlias).where(SkillAlias.alias == key, SkillAlias.skill_id == skill_id))
+        if not db.get(SkillAlias, new_key):
+            db.add(SkillAlias(alias=new_key, skill_id=skill_id))
+    db.flush()
+
+
+def _get_or_create_skill(db: Session, name: str) -> int:
+    key = normalize_skill(name)
+    existing = db.execute(
+        select(Skill.id, Skill.name)
+        .join(SkillAlias, SkillAlias.skill_id == Skill.id, isouter=True)
+        .where((SkillAlias.alias == key) | (Skill.key == key))
+        .limit(1)
+    ).first()
+    if existing is not None:
+        _remember(key, existing.id, existing.name)
+        return existing.id
+
+    try:
+        with db.begin_nested():
+            skill = Skill(name=name.strip()[:100], key=key)
+            db.add(skill)
+            db.flush()
+            db.add(SkillAlias(alias=key, skill_id=skill.id))
+        _remember(key, skill.id, skill.name)
+        return skill.id
+    except IntegrityError:
+        # Another request created it concurrently
+        skill = db.execute(select(Skill.id, Skill.name).where(Skill.key == key)).one()
+        _remember(key, skill.id, skill.name)
+        return skill.id
+
+
+def resolve_skill_ids(db: Session, names: Iterable[str]) -> List[int]:
+    """Resolve free-text skill names to sorted, de-duplicated canonical ids"""
+    ids = set()
+    for name in names or []:
+        if not name or not name.strip():
+            continue
+        key = normalize_skill(name)
+        skill_id = _key_to_id.get(key)
+        if skill_id is None:
+            skill_id = _get_or_create_skill(db, name)
+        ids.add(skill_id)
+    return sorted(ids)
+
+
+def sync_student_skills(db: Session, student: Student) -> List[int]:
+    """Rewrite the student_skills rows from the student's skills and technologies"""
+    skill_ids = resolve_skill_ids(db, (student.skills or []) + (student.technologies or []))
+    db.execute(delete(student_skills).where(student_skills.c.student_id == student.id))
+    if skill_ids:
+        db.execute(
+            insert(student_skills),
+            [{"student_id": student.id, "skill_id": skill_id} for skill_id in skill_ids],
+        )
+    return skill_ids
+
+
+def sync_pfe_skills(db: Session, pfe: PFEListing) -> List[int]:
+    """Rewrite the pfe_skills rows from the listing's required skills"""
+    skill_ids = resolve_skill_ids(db, pfe.skills or [])
+    db.execute(delete(pfe_skills).where(pfe_skills.c.pfe_listing_id == pfe.id))
+    if skill_ids:
+        db.execute(
+            insert(pfe_skills),
+            [{"pfe_listing_id": pfe.id, "skill_id": skill_id} for skill_id in skill_ids],
+        )
+    return skill_ids
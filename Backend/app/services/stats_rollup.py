@@ -0,0 +1,125 @@
+"""
+Per-enterprise / per-PFE application statistics rollup.
+
+Rows in `pfe_stats_rollup` are adjusted in the same transaction as the
+application change (see app.services.application_events), so dashboard
+reads are a primary-key range lookup instead of a scan over applications.
+`rebuild_stats_rollup` recomputes every row from the applications table
+and repairs any drift:
+
+    python -m app.services.stats_rollup
+"""
+from collections import defaultdict
+from typing import Dict, Optional
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+from app.db.counters import increment
+from app.models import Application, PFEListing, PFEStatsRollup
+from app.models.application import ApplicationStatus
+
+# Applicants at or above this match rate count as top applicants
+TOP_APPLICANT_MATCH_RATE = 80
+
+_rollup = PFEStatsRollup.__table__
+
+
+def _status_column(status) -> str:
+    return ApplicationStatus(status).value
+
+
+def _match_rate_deltas(match_rate: Optional[int], sign: int) -> Dict[str, int]:
+    # Unscored applications stay out of the average match rate
+    rate = match_rate or 0
+    return {
+        "top_applicants": sign if rate >= TOP_APPLICANT_MATCH_RATE else 0,
+        "match_rate_sum": sign * rate,
+        "match_rate_count": sign if match_rate is not None else 0,
+    }
+
+
+def _increment(db: Session, enterprise_id: int, pfe_listing_id: int, deltas: Dict[str, int]) -> None:
+    if enterprise_id is None:
+        return
+    increment(db, _rollup, {"enterprise_id": enterprise_id, "pfe_listing_id": pfe_listing_id}, deltas)
+
+
+def record_application_created(db: Session, application: Application, enterprise_id: int) -> None:
+    deltas = _match_rate_deltas(application.match_rate, 1)
+    deltas[_status_column(application.status or ApplicationStatus.PENDING)] = 1
+    deltas["total_applications"] = 1
+    _increment(db, enterprise_id, application.pfe_listing_id, deltas)
+
+
+def record_status_changed(db: Session, application: Application, enterprise_id: int, old_status, new_status) -> None:
+    record_status_changes(db, [(application, old_status, new_status)], enterprise_id)
+
+
+def record_status_changes(db: Session, changes, enterprise_id: int) -> None:
+    """Status changes of several applications of one enterprise, one upsert per listing"""
+    per_listing: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for application, old_status, new_status in changes:
+        old_column, new_column = _status_column(old_status), _status_column(new_status)
+        if old_column != new_column:
+            per_listing[application.pfe_listing_id][old_column] -= 1
+            per_listing[application.pfe_listing_id][new_column] += 1
+    for pfe_listing_id, deltas in per_listing.items():
+        _increment(db, enterprise_id, pfe_listing_id, dict(deltas))
+
+
+def record_match_rate_changed(db: Session, application: Application, enterprise_id: int, old_match_rate: Optional[int]) -> None:
+    removed = _match_rate_deltas(old_match_rate, -1)
+    added = _match_rate_deltas(application.match_rate, 1)
+    _increment(
+        db, enterprise_id, application.pfe_listing_id,
+        {column: removed[column] + added[column] for column in added},
+    )
+
+
+def rebuild_stats_rollup(db: Session) -> int:
+    """Recompute the whole rollup from the applications table. Returns the number of rows."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Block concurrent increments until the rebuilt rows are committed;
+        # applications committed after our snapshot increment on top of them
+        db.execute(text("LOCK TABLE pfe_stats_rollup IN EXCLUSIVE MODE"))
+
+    match_rate = func.coalesce(Application.match_rate, 0)
+    status_counts = [
+        func.count(Application.id).filter(Application.status == status).label(status.value)
+        for status in ApplicationStatus
+    ]
+    rows = db.execute(
+        select(
+            PFEListing.enterprise_id,
+            Application.pfe_listing_id,
+            *status_counts,
+            func.count(Application.id).label("total_applications"),
+            func.count(Application.id).filter(match_rate >= TOP_APPLICANT_MATCH_RATE).label("top_applicants"),
+            func.sum(match_rate).label("match_rate_sum"),
+            func.count(Application.match_rate).label("match_rate_count"),
+        )
+        .join(PFEListing, PFEListing.id == Application.pfe_listing_id)
+        .where(PFEListing.enterprise_id.isnot(None))
+        .group_by(PFEListing.enterprise_id, Application.pfe_listing_id)
+    ).mappings().all()
+
+    db.execute(delete(_rollup))
+    if rows:
+        db.execute(insert(_rollup), [dict(row) for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def ensure_stats_rollup(db: Session) -> None:
+    """Build the rollup on databases that have applications but no rollup rows yet"""
+    if db.scalar(select(_rollup.c.pfe_listing_id).limit(1)) is None and db.scalar(select(Application.id).limit(1)) is not None:
+        rebuild_stats_rollup(db)
+
+
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_stats_rollup(session)} statistics rollup rows")
+    finally:
+        session.close()
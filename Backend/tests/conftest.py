@@ -0,0 +1,5 @@
+import os
+
+# Settings are read at import time; tests never touch the configured database
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
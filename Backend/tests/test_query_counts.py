@@ -0,0 +1,87 @@
+"""
+Query-count checks: list endpoints must run a fixed number of statements,
+however many rows they return (no lazy loads per row).
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+from app.core.dependencies import Principal
+from app.db.database import Base
+from app.models import Application, Enterprise, PFEListing, Student, User, UserRole
+from app.pfe.router import get_pfe_listings_for_students
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+class _StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def _seed(db: Session, listings: int) -> Principal:
+    enterprise_user = User(email="company@example.com", password_hash="x", role=UserRole.ENTERPRISE)
+    student_user = User(email="student@example.com", password_hash="x", role=UserRole.STUDENT)
+    db.add_all([enterprise_user, student_user])
+    db.flush()
+    enterprise = Enterprise(user_id=enterprise_user.id, company_name="Acme", industry="Software")
+    student = Student(user_id=student_user.id, first_name="Ada", last_name="Lovelace")
+    db.add_all([enterprise, student])
+    db.flush()
+    for i in range(listings):
+        pfe = PFEListing(
+            title=f"Listing {i}",
+            category="Web",
+            duration="6 months",
+            description=f"Description {i}",
+            enterprise_id=enterprise.id,
+        )
+        db.add(pfe)
+        db.flush()
+        db.add(Application(student_id=student.id, pfe_listing_id=pfe.id, match_rate=50))
+    principal = Principal(
+        id=student_user.id,
+        email=student_user.email,
+        role=UserRole.STUDENT,
+        is_active=True,
+        profile_completed=True,
+        student_id=student.id,
+    )
+    db.commit()
+    db.expunge_all()
+    return principal
+
+
+def _explore_statements(db: Session, listings: int) -> int:
+    principal = _seed(db, listings)
+    with _StatementCounter(db.get_bind()) as counter:
+        result = get_pfe_listings_for_students(skills=None, db=db, current_user=principal)
+    assert len(result) == listings
+    assert all(listing["description"] and listing["applicantCount"] == 1 for listing in result)
+    return counter.count
+
+
+def test_explore_query_count_does_not_grow_with_listings(db):
+    assert _explore_statements(db, 10) == 1
+
+
+def test_explore_single_listing(db):
+    assert _explore_statements(db, 1) == 1
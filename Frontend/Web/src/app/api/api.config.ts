@@ -12,6 +12,8 @@ export const ENDPOINTS = {
         REGISTER_STUDENT: '/auth/register/student',
         REGISTER_ENTERPRISE: '/auth/register/enterprise',
         LOGIN: '/auth/login',
+        REFRESH: '/auth/refresh',
+        LOGOUT: '/auth/logout',
     },
 
     // Students
@@ -0,0 +1,36 @@
+import { inject } from '@angular/core';
+import { HttpErrorResponse, HttpInterceptorFn } from '@angular/common/http';
+import { catchError, switchMap, throwError } from 'rxjs';
+import { AuthService } from '../services/auth.service';
+
+/**
+ * When an authenticated request fails with 401 because the access token
+ * expired, exchange the refresh token for a new pair and retry the request
+ * once. Logs out if the refresh token is rejected too.
+ */
+export const authRefreshInterceptor: HttpInterceptorFn = (req, next) => {
+    const authService = inject(AuthService);
+
+    return next(req).pipe(
+        catchError((error: unknown) => {
+            const isExpiredToken = error instanceof HttpErrorResponse
+                && error.status === 401
+                && req.headers.has('Authorization')
+                && !req.url.includes('/auth/');
+
+            if (!isExpiredToken || !localStorage.getItem('pfe_match_refresh_token')) {
+                return throwError(() => error);
+            }
+
+            return authService.refreshAccessToken().pipe(
+                catchError(() => {
+                    authService.logout();
+                    return throwError(() => error);
+                }),
+                switchMap(response => next(req.clone({
+                    setHeaders: { Authorization: `Bearer ${response.access_token}` }
+                })))
+            );
+        })
+    );
+};
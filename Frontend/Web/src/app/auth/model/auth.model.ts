@@ -22,10 +22,15 @@ export interface LoginRequest {
     password: string;
 }
 
+export interface RefreshTokenRequest {
+    refresh_token: string;
+}
+
 // ==================== RESPONSE DTOs ====================
 
 export interface AuthResponse {
     access_token: string;
+    refresh_token?: string;
     token_type: string;
     user_type: UserType;
     profile_completed: boolean;
@@ -1,5 +1,5 @@
 import { Injectable } from '@angular/core';
-import { BehaviorSubject, Observable, tap, catchError, throwError, Subject } from 'rxjs';
+import { BehaviorSubject, Observable, tap, catchError, throwError, Subject, finalize, shareReplay } from 'rxjs';
 import { Router } from '@angular/router';
 import { ApiService, ENDPOINTS } from '../../api';
 import {
@@ -23,6 +23,7 @@ import {
 })
 export class AuthService {
     private readonly TOKEN_KEY = 'pfe_match_token';
+    private readonly REFRESH_TOKEN_KEY = 'pfe_match_refresh_token';
     private readonly USER_TYPE_KEY = 'pfe_match_user_type';
     private readonly PROFILE_COMPLETED_KEY = 'pfe_match_profile_completed';
     private readonly EMAIL_KEY = 'pfe_match_email';
@@ -41,6 +42,9 @@ export class AuthService {
     private profileUpdated = new Subject<void>();
     profileUpdated$ = this.profileUpdated.asObservable();
 
+    // Refresh request shared by every caller while it is in flight
+    private refreshInFlight: Observable<AuthResponse> | null = null;
+
     constructor(
         private api: ApiService,
         private router: Router
@@ -96,6 +100,22 @@ export class AuthService {
         return this.authState.value.token;
     }
 
+    /**
+     * Whether the stored access token is missing or past its expiry
+     */
+    isAccessTokenExpired(): boolean {
+        const token = this.token;
+        if (!token) {
+            return true;
+        }
+        try {
+            const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+            return typeof payload.exp === 'number' && payload.exp * 1000 <= Date.now();
+        } catch {
+            return true;
+        }
+    }
+
     /**
      * Get current user type
      */
@@ -133,11 +153,35 @@ export class AuthService {
         );
     }
 
+    /**
+     * Exchange the stored refresh token for a new token pair.
+     * Concurrent callers share one request, since each refresh token is single-use.
+     */
+    refreshAccessToken(): Observable<AuthResponse> {
+        const refreshToken = localStorage.getItem(this.REFRESH_TOKEN_KEY);
+        if (!refreshToken) {
+            return throwError(() => new Error('No refresh token'));
+        }
+
+        if (!this.refreshInFlight) {
+            const email = localStorage.getItem(this.EMAIL_KEY) || '';
+            this.refreshInFlight = this.api.postPublic<AuthResponse>(ENDPOINTS.AUTH.REFRESH, { refresh_token: refreshToken }).pipe(
+                tap((response: AuthResponse) => this.handleAuthResponse(response, email)),
+                finalize(() => this.refreshInFlight = null),
+                shareReplay(1)
+            );
+        }
+        return this.refreshInFlight;
+    }
+
     /**
      * Handle successful authentication response
      */
     private handleAuthResponse(response: AuthResponse, email: string): void {
         localStorage.setItem(this.TOKEN_KEY, response.access_token);
+        if (response.refresh_token) {
+            localStorage.setItem(this.REFRESH_TOKEN_KEY, response.refresh_token);
+        }
         localStorage.setItem(this.USER_TYPE_KEY, response.user_type);
         localStorage.setItem(this.PROFILE_COMPLETED_KEY, String(response.profile_completed));
         localStorage.setItem(this.EMAIL_KEY, email); 
@@ -155,7 +199,15 @@ export class AuthService {
      * Logout user
      */
     logout(): void {
+        const refreshToken = localStorage.getItem(this.REFRESH_TOKEN_KEY);
+        if (refreshToken) {
+            // Revoke server-side; the local session ends either way
+            this.api.postPublic<MessageResponse>(ENDPOINTS.AUTH.LOGOUT, { refresh_token: refreshToken })
+                .subscribe({ error: () => undefined });
+        }
+
         localStorage.removeItem(this.TOKEN_KEY);
+        localStorage.removeItem(this.REFRESH_TOKEN_KEY);
         localStorage.removeItem(this.USER_TYPE_KEY);
         localStorage.removeItem(this.PROFILE_COMPLETED_KEY);
         localStorage.removeItem(this.EMAIL_KEY);
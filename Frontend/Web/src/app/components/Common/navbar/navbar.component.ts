@@ -24,7 +24,6 @@ export class NavbarComponent implements OnInit, OnDestroy {
   private authSubscription?: Subscription;
   private profileSubscription?: Subscription;
   private profileUpdatedSubscription?: Subscription;
-  private pollingSubscription?: Subscription;
 
   constructor(
     private authService: AuthService,
@@ -40,8 +39,10 @@ export class NavbarComponent implements OnInit, OnDestroy {
         // Load notifications when user is authenticated
         this.notificationService.getNotifications().subscribe();
         this.notificationService.getUnreadCount().subscribe();
-        // Start polling for new notifications every 30 seconds
-        this.pollingSubscription = this.notificationService.startPolling(30000).subscribe();
+        // Receive new notifications as they are created
+        this.notificationService.connect();
+      } else {
+        this.notificationService.disconnect();
       }
     });
 
@@ -55,7 +56,7 @@ export class NavbarComponent implements OnInit, OnDestroy {
     this.authSubscription?.unsubscribe();
     this.profileSubscription?.unsubscribe();
     this.profileUpdatedSubscription?.unsubscribe();
-    this.pollingSubscription?.unsubscribe();
+    this.notificationService.disconnect();
   }
 
   private loadProfile(): void {
@@ -27,6 +27,16 @@ export interface ApplicantDetails extends ApplicantWithStatus {
   portfolioUrl?: string;
   technologies?: string[];
   profilePicture?: string;
+  matchExplanation?: string;
+  matchedSkills?: string[];
+  missingSkills?: string[];
+  recommendations?: string;
+}
+
+export interface BulkStatusUpdateResponse {
+  updated: { id: number; status: ApplicantWithStatus['status']; previousStatus: ApplicantWithStatus['status'] }[];
+  unchanged: number[];
+  notFound: number[];
 }
 
 @Injectable({
@@ -121,6 +131,32 @@ export class ApplicantService {
     );
   }
 
+  /**
+   * Mettre à jour le statut de plusieurs applicants en une seule requête
+   */
+  updateApplicantStatuses(
+    updates: { id: string; status: ApplicantWithStatus['status'] }[]
+  ): Observable<BulkStatusUpdateResponse> {
+    return this.http.patch<BulkStatusUpdateResponse>(
+      `${this.API_URL}/applicants/status`,
+      { updates: updates.map(u => ({ id: Number(u.id), status: u.status })) },
+      { headers: this.getAuthHeaders() }
+    ).pipe(
+      tap(response => {
+        const statuses = new Map(response.updated.map(u => [String(u.id), u.status]));
+        const current = this.applicantsSubject.value;
+        const updated = current.map(a =>
+          statuses.has(String(a.id)) ? { ...a, status: statuses.get(String(a.id))! } : a
+        );
+        this.applicantsSubject.next(updated);
+      }),
+      catchError(error => {
+        console.error('Error updating applicant statuses:', error);
+        return throwError(() => error);
+      })
+    );
+  }
+
   /**
    * Obtenir les applicants en cache
    */
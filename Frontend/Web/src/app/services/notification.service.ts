@@ -1,6 +1,7 @@
 import { Injectable, inject, signal, computed } from '@angular/core';
 import { HttpClient, HttpHeaders } from '@angular/common/http';
-import { Observable, interval, switchMap, tap, catchError, of } from 'rxjs';
+import { Observable, Subscription, interval, switchMap, tap, catchError, of } from 'rxjs';
+import { AuthService } from '../auth/services/auth.service';
 
 export interface Notification {
   id: number;
@@ -17,13 +18,30 @@ export interface UnreadCountResponse {
   count: number;
 }
 
+interface StreamTicketResponse {
+  ticket: string;
+  expires_in: number;
+}
+
 @Injectable({
   providedIn: 'root'
 })
 export class NotificationService {
   private http = inject(HttpClient);
+  private authService = inject(AuthService);
   private readonly API_URL = 'http://localhost:8000/api/notifications';
   private readonly TOKEN_KEY = 'pfe_match_token';
+  private readonly POLLING_INTERVAL_MS = 30000;
+  // Failed stream connections in a row before falling back to polling
+  private readonly MAX_STREAM_FAILURES = 3;
+
+  // Server-sent events stream state
+  private eventSource: EventSource | null = null;
+  private ticketSubscription: Subscription | null = null;
+  private lastEventId: string | null = null;
+  private streamFailures = 0;
+  private reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+  private pollingSubscription: Subscription | null = null;
 
   // Signals for reactive state
   private notificationsSignal = signal<Notification[]>([]);
@@ -128,6 +146,142 @@ export class NotificationService {
     );
   }
 
+  /**
+   * Receive new notifications and unread-count changes as they happen.
+   * Uses the server-sent events stream and falls back to polling while the
+   * stream is unavailable. Safe to call repeatedly.
+   */
+  connect(): void {
+    if (this.eventSource || this.reconnectTimer) {
+      return;
+    }
+    if (typeof EventSource === 'undefined') {
+      this.startPollingFallback();
+      return;
+    }
+    this.openStream();
+  }
+
+  /**
+   * Close the stream and stop polling (on logout)
+   */
+  disconnect(): void {
+    this.ticketSubscription?.unsubscribe();
+    this.ticketSubscription = null;
+    this.eventSource?.close();
+    this.eventSource = null;
+    if (this.reconnectTimer) {
+      clearTimeout(this.reconnectTimer);
+      this.reconnectTimer = null;
+    }
+    this.stopPollingFallback();
+    this.lastEventId = null;
+    this.streamFailures = 0;
+  }
+
+  private openStream(): void {
+    if (!localStorage.getItem(this.TOKEN_KEY)) {
+      return;
+    }
+
+    // EventSource cannot send headers: exchange the access token for a
+    // short-lived stream ticket so the token itself never goes in a URL
+    this.ticketSubscription = this.http.post<StreamTicketResponse>(
+      `${this.API_URL}/stream-ticket`,
+      {},
+      { headers: this.getAuthHeaders() }
+    ).subscribe({
+      next: response => {
+        this.ticketSubscription = null;
+        this.connectStream(response.ticket);
+      },
+      error: () => {
+        this.ticketSubscription = null;
+        this.scheduleReconnect();
+      }
+    });
+  }
+
+  private connectStream(ticket: string): void {
+    const params = new URLSearchParams({ ticket });
+    if (this.lastEventId) {
+      params.set('last_event_id', this.lastEventId);
+    }
+    const source = new EventSource(`${this.API_URL}/stream?${params.toString()}`);
+    this.eventSource = source;
+
+    source.onopen = () => {
+      this.streamFailures = 0;
+      this.stopPollingFallback();
+    };
+
+    source.addEventListener('notification', (event: Event) => {
+      const message = event as MessageEvent;
+      this.lastEventId = message.lastEventId || this.lastEventId;
+      this.upsertNotification(JSON.parse(message.data));
+    });
+
+    // A notification merged with newer events (e.g. "3 new applications")
+    source.addEventListener('notification_updated', (event: Event) => {
+      this.upsertNotification(JSON.parse((event as MessageEvent).data));
+    });
+
+    source.addEventListener('unread_count', (event: Event) => {
+      const response: UnreadCountResponse = JSON.parse((event as MessageEvent).data);
+      this.unreadCountSignal.set(response.count);
+    });
+
+    source.onerror = () => {
+      // The browser reconnects by itself after a dropped connection; a closed
+      // source was rejected, typically because the ticket or the access
+      // token expired, and reconnects with a new ticket
+      if (source.readyState !== EventSource.CLOSED) {
+        return;
+      }
+      this.eventSource = null;
+      this.scheduleReconnect();
+    };
+  }
+
+  /**
+   * Put a streamed notification at the top of the list, replacing its previous version
+   */
+  private upsertNotification(notification: Notification): void {
+    const others = this.notificationsSignal().filter(n => n.id !== notification.id);
+    this.notificationsSignal.set([notification, ...others]);
+  }
+
+  private scheduleReconnect(): void {
+    this.streamFailures++;
+    if (this.streamFailures >= this.MAX_STREAM_FAILURES) {
+      this.startPollingFallback();
+    }
+
+    const delay = Math.min(30000, 1000 * 2 ** this.streamFailures);
+    this.reconnectTimer = setTimeout(() => {
+      this.reconnectTimer = null;
+      if (!this.authService.isAccessTokenExpired()) {
+        this.openStream();
+        return;
+      }
+      this.authService.refreshAccessToken().subscribe({
+        next: () => this.openStream(),
+        error: () => this.startPollingFallback()
+      });
+    }, delay);
+  }
+
+  private startPollingFallback(): void {
+    if (!this.pollingSubscription) {
+      this.pollingSubscription = this.startPolling(this.POLLING_INTERVAL_MS).subscribe();
+    }
+  }
+
+  private stopPollingFallback(): void {
+    this.pollingSubscription?.unsubscribe();
+    this.pollingSubscription = null;
+  }
+
   /**
    * Start polling for new notifications
    */